@@ -1,8 +1,15 @@
+import os
 from flask import Flask
 from flask_login import LoginManager
 from config import Config
 from app.models import db, User
 from app.utils.email import mail
+from app.utils.email_templates import email_templates
+from app.utils.realtime import socketio, socketio_options, event_bus
+from app.utils.presence import presence
+from app.utils.message_search import ensure_message_search_index
+from app.utils.schema import upgrade_schema
+from app.utils.archival import default_archive_url
 
 login_manager = LoginManager()
 
@@ -10,10 +17,20 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # Archived messages live on their own bind (see ArchivedMessage)
+    app.config['SQLALCHEMY_BINDS'] = dict(
+        app.config.get('SQLALCHEMY_BINDS') or {},
+        archive=app.config.get('ARCHIVE_DATABASE_URL') or default_archive_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    )
+    
     # Initialize extensions
     db.init_app(app)
     mail.init_app(app)
+    email_templates.init_app(app)
     login_manager.init_app(app)
+    socketio.init_app(app, **socketio_options(app.config.get('SOCKETIO_MESSAGE_QUEUE')))
+    presence.init_app(app)
+    event_bus.init_app(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
     login_manager.login_message_category = 'info'
@@ -29,6 +46,10 @@ def create_app(config_class=Config):
     from app.routes.wishlist import wishlist_bp
     from app.routes.calendar import calendar_bp
     from app.routes.admin_governance import admin_bp as admin_governance_bp
+    from app.routes.analytics import analytics_bp
+    from app.routes.messages import messages_bp, register_message_events
+    from app.routes.notifications import notifications_bp
+    from app.routes.payments import payments_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
@@ -36,6 +57,13 @@ def create_app(config_class=Config):
     app.register_blueprint(wishlist_bp)
     app.register_blueprint(calendar_bp)
     app.register_blueprint(admin_governance_bp)
+    app.register_blueprint(analytics_bp)
+    app.register_blueprint(messages_bp)
+    app.register_blueprint(notifications_bp)
+    app.register_blueprint(payments_bp)
+    
+    # Real-time messaging events
+    register_message_events(socketio)
     
     # Setup admin
     from app.admin import setup_admin
@@ -44,6 +72,26 @@ def create_app(config_class=Config):
     # Create database tables
     with app.app_context():
         db.create_all()
+        upgrade_schema()
+        ensure_message_search_index()
+    
+    # An invoice render pool process that ends up building an app (spawn
+    # re-imports the main module) must not start another set of workers
+    from app.utils.invoice_pdfs import RENDER_WORKER_ENV
+    if os.environ.get(RENDER_WORKER_ENV):
+        app.config.update(EMAIL_WORKERS=0, INVOICE_PDF_WORKERS=0, SCHEDULER_ENABLED=False)
+    
+    # Email outbox workers
+    from app.utils.outbox import outbox
+    outbox.init_app(app, mail)
+    
+    # Background invoice PDF rendering
+    from app.utils.invoice_pdfs import invoice_pdfs
+    invoice_pdfs.init_app(app)
+    
+    # Periodic jobs
+    from app.utils.scheduler import init_scheduler
+    init_scheduler(app)
     
     # Template filters
     @app.template_filter('datetime')
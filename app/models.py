@@ -116,7 +116,8 @@ class Property(db.Model):
         total_days = 365
         booked_days = 0
         for booking in self.bookings:
-            if booking.status in ['approved', 'completed']:
+            # Open-ended (long-term) bookings have no check-out date to count to
+            if booking.status in ['approved', 'completed'] and booking.check_out_date:
                 delta = booking.check_out_date - booking.check_in_date
                 booked_days += delta.days
         return (booked_days / total_days * 100) if total_days > 0 else 0
@@ -216,6 +217,10 @@ class Payment(db.Model):
 
 class Invoice(db.Model):
     __tablename__ = 'invoices'
+    __table_args__ = (
+        db.Index('ix_invoices_status_due_date', 'status', 'due_date'),
+        db.Index('ix_invoices_recurring_next_due', 'is_recurring', 'next_due_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -245,12 +250,15 @@ class Invoice(db.Model):
     is_recurring = db.Column(db.Boolean, default=False)
     recurrence_pattern = db.Column(db.String(50))  # 'monthly', 'quarterly', 'yearly'
     next_due_date = db.Column(db.DateTime)
+    # Set on invoices generated from a recurring one
+    recurring_parent_id = db.Column(db.Integer, db.ForeignKey('invoices.id'), index=True)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     payments = db.relationship('Payment', backref='invoice')
+    property = db.relationship('Property')
     
     def __repr__(self):
         return f'<Invoice {self.invoice_number}>'
@@ -258,6 +266,9 @@ class Invoice(db.Model):
 
 class PaymentSchedule(db.Model):
     __tablename__ = 'payment_schedules'
+    __table_args__ = (
+        db.Index('ix_payment_schedules_active_next', 'is_active', 'next_payment_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -269,50 +280,167 @@ class PaymentSchedule(db.Model):
     
     # Status
     is_active = db.Column(db.Boolean, default=True)
+    status = db.Column(db.String(20), default='active')  # 'active', 'overdue', 'completed'
     
     # Dates
     start_date = db.Column(db.DateTime, nullable=False)
     end_date = db.Column(db.DateTime)
+    first_payment_date = db.Column(db.DateTime)  # installments are counted from here
     next_payment_date = db.Column(db.DateTime, nullable=False)
     
+    # Installments generated so far (the next one has this sequence number)
+    installment_count = db.Column(db.Integer, default=0, nullable=False)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    booking = db.relationship('Booking')
+    installments = db.relationship('PaymentInstallment', backref='schedule', lazy='dynamic',
+                                   order_by='PaymentInstallment.sequence')
+    
     def __repr__(self):
         return f'<PaymentSchedule {self.id}>'
 
 
+class PaymentInstallment(db.Model):
+    """One due installment of a payment schedule, billed through an invoice"""
+    __tablename__ = 'payment_installments'
+    __table_args__ = (
+        db.UniqueConstraint('schedule_id', 'sequence', name='uq_payment_installment_sequence'),
+        db.Index('ix_payment_installments_status_due_date', 'status', 'due_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    schedule_id = db.Column(db.Integer, db.ForeignKey('payment_schedules.id'), nullable=False)
+    sequence = db.Column(db.Integer, nullable=False)  # zero-based
+    due_date = db.Column(db.DateTime, nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    
+    # Status: 'invoiced', 'paid'
+    status = db.Column(db.String(20), default='invoiced')
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id'), index=True)
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'))
+    paid_at = db.Column(db.DateTime)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    invoice = db.relationship('Invoice')
+    
+    def __repr__(self):
+        return f'<PaymentInstallment {self.schedule_id}#{self.sequence}>'
+
+
 # ==================== COMMUNICATION MODELS ====================
 
+class Conversation(db.Model):
+    """Summary row per user pair, kept in step with every message write"""
+    __tablename__ = 'conversations'
+    __table_args__ = (
+        db.UniqueConstraint('user_low_id', 'user_high_id', name='uq_conversations_pair'),
+        db.Index('ix_conversations_low_last', 'user_low_id', 'last_message_at'),
+        db.Index('ix_conversations_high_last', 'user_high_id', 'last_message_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # Participants, stored ordered so each pair has exactly one row
+    user_low_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_high_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    
+    # Latest message
+    last_message_id = db.Column(db.Integer, db.ForeignKey('messages.id', use_alter=True, name='fk_conversations_last_message'))
+    last_message_at = db.Column(db.DateTime)
+    
+    # Unread messages waiting for each participant
+    unread_count_low = db.Column(db.Integer, nullable=False, default=0)
+    unread_count_high = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Read cursors: each participant has read everything up to this message id
+    last_read_id_low = db.Column(db.Integer, nullable=False, default=0)
+    last_read_id_high = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Highest message id moved to cold storage (0: nothing archived)
+    archived_up_to_id = db.Column(db.Integer, nullable=False, default=0)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    last_message = db.relationship('Message', foreign_keys=[last_message_id], post_update=True)
+    
+    def other_user_id(self, user_id):
+        return self.user_high_id if user_id == self.user_low_id else self.user_low_id
+    
+    def __repr__(self):
+        return f'<Conversation {self.user_low_id} <-> {self.user_high_id}>'
+
+
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        db.Index('ix_messages_conversation_id', 'conversation_id', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'))
     
     # Message content
     subject = db.Column(db.String(255))
     content = db.Column(db.Text, nullable=False)
     
-    # Status
+    # Status (read state lives on the conversation's read cursors; is_read
+    # is only kept for messages that predate them)
     is_read = db.Column(db.Boolean, default=False)
     is_archived = db.Column(db.Boolean, default=False)
     
     # Conversation tracking
-    parent_message_id = db.Column(db.Integer, db.ForeignKey('messages.id'))
+    parent_message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), index=True)
     parent_message = db.relationship('Message', remote_side=[id], backref='replies')
     
-    # Timestamps
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Timestamps (created_at is indexed for the archival job's age cutoff)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def __repr__(self):
         return f'<Message {self.id} from {self.sender_id} to {self.recipient_id}>'
 
 
+class ArchivedMessage(db.Model):
+    """Cold copy of a Message moved out of the hot table by the archival job.
+
+    Lives on the 'archive' bind (its own database file when
+    ARCHIVE_DATABASE_URL is set), so it carries plain ids rather than
+    foreign keys.
+    """
+    __tablename__ = 'messages_archive'
+    __bind_key__ = 'archive'
+    __table_args__ = (
+        db.Index('ix_messages_archive_conversation_id', 'conversation_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    sender_id = db.Column(db.Integer, nullable=False)
+    recipient_id = db.Column(db.Integer, nullable=False)
+    conversation_id = db.Column(db.Integer, nullable=False)
+    subject = db.Column(db.String(255))
+    content = db.Column(db.Text, nullable=False)
+    is_read = db.Column(db.Boolean, default=False)
+    is_archived = db.Column(db.Boolean, default=False)
+    parent_message_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ArchivedMessage {self.id} from {self.sender_id} to {self.recipient_id}>'
+
+
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('ix_notifications_user_id_id', 'user_id', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -337,6 +465,96 @@ class Notification(db.Model):
         return f'<Notification {self.id} - {self.notification_type}>'
 
 
+class NotificationCounter(db.Model):
+    """Cached unread notification count per user, kept in step on insert/read"""
+    __tablename__ = 'notification_counters'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<NotificationCounter {self.user_id}: {self.unread_count}>'
+
+
+class NotificationPreference(db.Model):
+    """Per-user delivery preferences; users without a row get the defaults"""
+    __tablename__ = 'notification_preferences'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    
+    # Unread-message digest emails: 'off', 'hourly', 'daily' or 'weekly'
+    digest_frequency = db.Column(db.String(20), nullable=False, default='daily')
+    last_digest_at = db.Column(db.DateTime)
+    # Highest message id already covered by a digest
+    last_digest_message_id = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Notification channels (the in-app notification center is always on)
+    email_notifications = db.Column(db.Boolean, nullable=False, default=True)
+    push_notifications = db.Column(db.Boolean, nullable=False, default=True)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<NotificationPreference {self.user_id} digest={self.digest_frequency}>'
+
+
+class EmailOutbox(db.Model):
+    """Queued outgoing email, drained by the outbox worker pool"""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+        db.Index('ix_email_outbox_recipient_category', 'recipients', 'category', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    recipients = db.Column(db.Text, nullable=False)  # Comma-separated
+    sender = db.Column(db.String(255))
+    subject = db.Column(db.String(255), nullable=False)
+    html = db.Column(db.Text)
+    body = db.Column(db.Text)
+    category = db.Column(db.String(50))
+    # Number of emails coalesced into this one
+    parts = db.Column(db.Integer, nullable=False, default=1)
+    
+    # Status: 'pending', 'sending', 'sent', 'failed'
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    
+    # Claim held by a worker while sending
+    locked_by = db.Column(db.String(64))
+    locked_at = db.Column(db.DateTime)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} {self.status}>'
+
+
+class ReminderDispatch(db.Model):
+    """Ledger of reminder emails already queued, so each goes out once"""
+    __tablename__ = 'reminder_dispatches'
+    __table_args__ = (
+        db.UniqueConstraint('reminder_type', 'target_id', 'due_at', name='uq_reminder_dispatches_target'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # Type: 'invoice_due', 'lease_expiry'
+    reminder_type = db.Column(db.String(30), nullable=False)
+    target_id = db.Column(db.Integer, nullable=False)  # Invoice or lease id
+    # The due/end date reminded about; moving it allows a fresh reminder
+    due_at = db.Column(db.DateTime, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    sent_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ReminderDispatch {self.reminder_type} {self.target_id}>'
+
+
 # ==================== AVAILABILITY & SCHEDULING MODELS ====================
 
 class PropertyAvailability(db.Model):
@@ -363,6 +581,9 @@ class PropertyAvailability(db.Model):
 
 class Lease(db.Model):
     __tablename__ = 'leases'
+    __table_args__ = (
+        db.Index('ix_leases_status_end_date', 'status', 'end_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id'), nullable=False)
@@ -452,6 +673,9 @@ class Document(db.Model):
 
 class PropertyAnalytics(db.Model):
     __tablename__ = 'property_analytics'
+    __table_args__ = (
+        db.Index('ix_property_analytics_property_date', 'property_id', 'analytics_date', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     property_id = db.Column(db.Integer, db.ForeignKey('properties.id'), nullable=False)
@@ -473,6 +697,19 @@ class PropertyAnalytics(db.Model):
         return f'<PropertyAnalytics {self.property_id} on {self.analytics_date}>'
 
 
+class AnalyticsCheckpoint(db.Model):
+    """High-water mark for incremental jobs that consume append-only tables"""
+    __tablename__ = 'analytics_checkpoints'
+    
+    name = db.Column(db.String(50), primary_key=True)  # e.g. 'funnel'
+    last_processed_id = db.Column(db.Integer, nullable=False, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AnalyticsCheckpoint {self.name} @ {self.last_processed_id}>'
+
+
 class SystemAnalytics(db.Model):
     __tablename__ = 'system_analytics'
     
@@ -3,6 +3,9 @@ from flask_login import login_required, current_user
 from functools import wraps
 from app import db
 from app.models import User, Property, Booking, Review, ReportAbuse, UserSuspension, UserActivityLog
+from app.utils.throttle import typing_throttle, email_limiter
+from app.utils.outbox import outbox, queue_depth
+from app.utils.notification_dispatch import notify
 from datetime import datetime, timedelta
 from sqlalchemy import func
 
@@ -237,6 +240,47 @@ def resolve_report(report_id):
     return redirect(url_for('admin_governance.reports'))
 
 
+@admin_bp.route('/broadcast', methods=['POST'])
+@login_required
+@admin_required
+def broadcast():
+    """Send an announcement to every active user with a role (or everyone)"""
+    data = request.get_json(silent=True) or {}
+    title = (data.get('title') or '').strip()
+    message = (data.get('message') or '').strip()
+    role = data.get('role', 'all')
+    
+    if not title or not message:
+        return jsonify({'error': 'title and message are required'}), 400
+    if role not in ('all', 'landlord', 'general'):
+        return jsonify({'error': 'role must be one of: all, landlord, general'}), 400
+    
+    try:
+        query = db.session.query(User.id).filter(User.is_active.isnot(False), User.role != 'admin')
+        if role != 'all':
+            query = query.filter(User.role == role)
+        user_ids = [row[0] for row in query.order_by(User.id)]
+        
+        channel_names = ('in_app', 'email', 'push') if data.get('email') else ('in_app', 'push')
+        sent = notify(user_ids, title, message, 'announcement', channel_names=channel_names,
+                      email=('announcement', title, {'title': title, 'message': message}))
+        
+        log = UserActivityLog(
+            user_id=current_user.id,
+            action='broadcast',
+            description=f'Broadcast "{title}" to {sent} users ({role})',
+            resource_type='notification'
+        )
+        db.session.add(log)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error broadcasting notification: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({'success': True, 'recipients': sent})
+
+
 @admin_bp.route('/activity-logs')
 @login_required
 @admin_required
@@ -256,3 +300,27 @@ def activity_logs():
     logs = query.order_by(UserActivityLog.created_at.desc()).limit(100).all()
     
     return render_template('admin_governance/activity_logs.html', logs=logs)
+
+
+@admin_bp.route('/realtime-metrics')
+@login_required
+@admin_required
+def realtime_metrics():
+    """Counters for the real-time messaging layer"""
+    return jsonify({
+        'success': True,
+        'typing': typing_throttle.metrics()
+    })
+
+
+@admin_bp.route('/email-queue')
+@login_required
+@admin_required
+def email_queue():
+    """Outbox depth for monitoring the email workers"""
+    return jsonify({
+        'success': True,
+        'queue': queue_depth(),
+        'workers': len(outbox.workers),
+        'limiter': email_limiter.metrics()
+    })
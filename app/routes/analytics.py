@@ -0,0 +1,143 @@
+from flask import Blueprint, jsonify, request, current_app
+from flask_login import login_required, current_user
+from functools import wraps
+from datetime import datetime, timedelta
+from app.models import Property
+from app.utils.timeseries import METRICS, GRANULARITIES, build_timeseries
+from app.utils.forecast import forecast_cash_flow
+from app.utils.funnel import aggregate_funnel, funnel_report
+
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/analytics')
+
+
+def landlord_or_admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated or current_user.role not in ('landlord', 'admin'):
+            return jsonify({'error': 'Unauthorized'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _parse_date(value, default):
+    if not value:
+        return default
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _resolve_landlord_id():
+    """Admins may inspect any landlord; landlords only see themselves"""
+    if current_user.role == 'admin':
+        return request.args.get('landlord_id', current_user.id, type=int)
+    return current_user.id
+
+
+@analytics_bp.route('/timeseries/<metric>', methods=['GET'])
+@login_required
+@landlord_or_admin_required
+def timeseries(metric):
+    """Chart-ready time series for revenue, bookings, occupancy or views"""
+    if metric not in METRICS:
+        return jsonify({'error': f'Unknown metric. Choose one of: {", ".join(METRICS)}'}), 400
+
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f'Unknown granularity. Choose one of: {", ".join(GRANULARITIES)}'}), 400
+
+    try:
+        end = _parse_date(request.args.get('end'), datetime.utcnow().date())
+        start = _parse_date(request.args.get('start'), end - timedelta(days=365))
+    except ValueError:
+        return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+
+    if start > end:
+        return jsonify({'error': 'start must be before end'}), 400
+
+    landlord_id = _resolve_landlord_id()
+    property_id = request.args.get('property_id', type=int)
+    if property_id:
+        property = Property.query.get_or_404(property_id)
+        if property.landlord_id != landlord_id:
+            return jsonify({'error': 'Unauthorized'}), 403
+
+    if metric == 'views':
+        # Views are rolled up from the activity log on demand
+        aggregate_funnel()
+
+    # Never return more than the configured cap, whatever the client asks for
+    max_points = current_app.config['TIMESERIES_MAX_POINTS']
+    points = request.args.get('points', max_points, type=int)
+    points = max(3, min(points, max_points))
+
+    return jsonify(build_timeseries(
+        metric,
+        landlord_id,
+        start,
+        end,
+        granularity=granularity,
+        max_points=points,
+        property_id=property_id
+    ))
+
+
+@analytics_bp.route('/forecast', methods=['GET'])
+@login_required
+@landlord_or_admin_required
+def forecast():
+    """Projected monthly cash flow from active leases and payment schedules"""
+    months = request.args.get('months', 12, type=int)
+    months = max(1, min(months, current_app.config['FORECAST_MAX_MONTHS']))
+
+    try:
+        start = _parse_date(request.args.get('start'), datetime.utcnow().date())
+    except ValueError:
+        return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+
+    # Admins get the whole portfolio unless they narrow it to one landlord
+    if current_user.role == 'admin':
+        landlord_id = request.args.get('landlord_id', type=int)
+    else:
+        landlord_id = current_user.id
+
+    property_id = request.args.get('property_id', type=int)
+    if property_id and current_user.role != 'admin':
+        property = Property.query.get_or_404(property_id)
+        if property.landlord_id != current_user.id:
+            return jsonify({'error': 'Unauthorized'}), 403
+
+    report = forecast_cash_flow(
+        start=start,
+        months=months,
+        landlord_id=landlord_id,
+        property_id=property_id
+    )
+    report['success'] = True
+    return jsonify(report)
+
+
+@analytics_bp.route('/funnel', methods=['GET'])
+@login_required
+@landlord_or_admin_required
+def funnel():
+    """View -> inquiry -> booking conversion per property and day"""
+    try:
+        end = _parse_date(request.args.get('end'), datetime.utcnow().date())
+        start = _parse_date(request.args.get('start'), end - timedelta(days=30))
+    except ValueError:
+        return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+
+    property_ids = [
+        row.id for row in Property.query.with_entities(Property.id).filter_by(landlord_id=_resolve_landlord_id())
+    ]
+    property_id = request.args.get('property_id', type=int)
+    if property_id:
+        if property_id not in property_ids:
+            return jsonify({'error': 'Unauthorized'}), 403
+        property_ids = [property_id]
+
+    # Only log rows written since the last run are read here
+    aggregate_funnel()
+
+    report = funnel_report(property_ids, start, end)
+    report['success'] = True
+    return jsonify(report)
@@ -24,14 +24,15 @@ def register():
         user.set_password(form.password.data)
         
         db.session.add(user)
-        db.session.commit()
         
-        # Send welcome email
+        # Send welcome email (queued in the same transaction as the user)
         try:
             send_welcome_email(user)
         except Exception as e:
             print(f"Error sending welcome email: {e}")
         
+        db.session.commit()
+        
         flash('Registration successful! Please check your email and log in.', 'success')
         return redirect(url_for('auth.login'))
     
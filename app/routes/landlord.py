@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, Response, stream_with_context, abort, jsonify
 from flask_login import login_required, current_user
 from functools import wraps
 from app import db
@@ -6,7 +6,9 @@ from app.models import Property, Booking, Review
 from datetime import datetime
 from werkzeug.utils import secure_filename
 import os
-from app.utils.email import send_booking_approved_email, send_booking_rejected_email
+from app.utils.notification_dispatch import notify
+from app.utils.exports import EXPORT_DATASETS, EXPORT_FORMATS, iter_export
+from app.utils.pricing import price_suggestions
 
 landlord_bp = Blueprint('landlord', __name__, url_prefix='/landlord')
 
@@ -207,11 +209,40 @@ def delete_property(id):
     
     db.session.delete(property)
     db.session.commit()
+    price_suggestions.remove(id)
     
     flash('Property deleted successfully.', 'success')
     return redirect(url_for('landlord.properties'))
 
 
+@landlord_bp.route('/property/price-suggestion')
+@login_required
+@landlord_required
+def price_suggestion():
+    """Suggest a monthly price from comparable listings (AJAX)"""
+    city = request.args.get('city', '')
+    province = request.args.get('province', '')
+    if not city and not province:
+        return jsonify({'success': False, 'message': 'City or province is required'}), 400
+    
+    suggestion = price_suggestions.suggest(
+        city=city,
+        province=province,
+        property_type=request.args.get('property_type', ''),
+        bedrooms=request.args.get('bedrooms', 0, type=int),
+        bathrooms=request.args.get('bathrooms', 0, type=int),
+        amenities=request.args.get('amenities', ''),
+        latitude=request.args.get('latitude', type=float),
+        longitude=request.args.get('longitude', type=float),
+        exclude_id=request.args.get('property_id', type=int)
+    )
+    
+    if suggestion is None:
+        return jsonify({'success': False, 'message': 'Not enough comparable properties yet'})
+    
+    return jsonify({'success': True, **suggestion})
+
+
 @landlord_bp.route('/bookings')
 @login_required
 @landlord_required
@@ -225,6 +256,24 @@ def bookings():
     return render_template('landlord/bookings.html', bookings=bookings)
 
 
+@landlord_bp.route('/export/<dataset>.<fmt>')
+@login_required
+@landlord_required
+def export(dataset, fmt):
+    """Stream bookings, payments or invoices as CSV or NDJSON"""
+    if dataset not in EXPORT_DATASETS or fmt not in EXPORT_FORMATS:
+        abort(404)
+    
+    query = EXPORT_DATASETS[dataset](current_user.id)
+    filename = f"{dataset}_{datetime.utcnow().strftime('%Y%m%d')}.{fmt}"
+    
+    return Response(
+        stream_with_context(iter_export(query, fmt)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
 @landlord_bp.route('/booking/<int:id>/approve', methods=['POST'])
 @login_required
 @landlord_required
@@ -244,13 +293,18 @@ def approve_booking(id):
     booking.response = request.form.get('response', '')
     property.available_rooms -= booking.num_rooms
     
-    db.session.commit()
+    # Notify the tenant (in-app, email and push)
+    notify(
+        [booking.user],
+        'Booking Approved',
+        f'Your booking for {property.title} has been approved!',
+        'booking',
+        email=('booking_approved', f'Booking Approved - {property.title}',
+               {'booking': booking, 'response': booking.response}),
+        related_booking_id=booking.id
+    )
     
-    # Send approval email to tenant
-    try:
-        send_booking_approved_email(booking.user, booking, booking.response)
-    except Exception as e:
-        print(f"Error sending approval email: {e}")
+    db.session.commit()
     
     flash('Booking approved successfully!', 'success')
     return redirect(url_for('landlord.bookings'))
@@ -270,13 +324,18 @@ def reject_booking(id):
     booking.status = 'rejected'
     booking.response = request.form.get('response', '')
     
-    db.session.commit()
+    # Notify the tenant (in-app, email and push)
+    notify(
+        [booking.user],
+        'Booking Update',
+        f'Your booking request for {property.title} could not be approved.',
+        'booking',
+        email=('booking_rejected', f'Booking Update - {property.title}',
+               {'booking': booking, 'response': booking.response}),
+        related_booking_id=booking.id
+    )
     
-    # Send rejection email to tenant
-    try:
-        send_booking_rejected_email(booking.user, booking, booking.response)
-    except Exception as e:
-        print(f"Error sending rejection email: {e}")
+    db.session.commit()
     
     flash('Booking rejected.', 'info')
     return redirect(url_for('landlord.bookings'))
@@ -5,6 +5,7 @@ from app import db
 from sqlalchemy import or_, and_
 import random
 from app.utils.email import send_new_booking_request_email
+from app.utils.funnel import track_funnel_event
 
 main_bp = Blueprint('main', __name__)
 
@@ -86,10 +87,21 @@ def property_detail(id):
             property_id=id
         ).first() is not None
     
-    return render_template('properties/detail.html', 
+    page = render_template('properties/detail.html', 
                          property=property, 
                          reviews=reviews,
                          has_booked=has_booked)
+    
+    # Record the view for funnel analytics after rendering, so the commit
+    # doesn't expire objects the template still needs
+    try:
+        track_funnel_event('view_property', id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error logging property view: {e}")
+    
+    return page
 
 
 @main_bp.route('/property/<int:id>/book', methods=['GET', 'POST'])
@@ -128,15 +140,17 @@ def book_property(id):
         )
         
         db.session.add(booking)
-        db.session.commit()
+        track_funnel_event('create_booking', property.id, f'Booking request for {num_rooms} room(s)')
         
-        # Send email notification to landlord
+        # Email the landlord; queued in the same transaction as the booking
         try:
             landlord = property.landlord
             send_new_booking_request_email(landlord, booking)
         except Exception as e:
             print(f"Error sending booking notification email: {e}")
         
+        db.session.commit()
+        
         flash('Booking request submitted successfully! The landlord will review your request.', 'success')
         return redirect(url_for('main.my_bookings'))
     
@@ -2,13 +2,42 @@ from flask import Blueprint, render_template, request, jsonify, redirect, url_fo
 from flask_login import login_required, current_user
 from flask_socketio import emit, join_room, leave_room
 from datetime import datetime
-from app.models import db, Message, Notification, User, Booking
-from app.utils.email import send_email
+from app.models import db, Message, User, Booking
+from app.utils.notification_dispatch import notify
+from app.utils.funnel import track_funnel_event
+from app.utils.realtime import socketio, user_room
+from app.utils.presence import presence
+from app.utils.throttle import typing_throttle, TYPING_TTL_SECONDS
+from app.utils.message_search import search_messages
+from app.utils.conversations import (
+    record_message, advance_read_cursor, is_message_read, unread_count, message_deleted,
+    conversation_list_query, conversation_room, conversation_history, get_conversation
+)
 
 messages_bp = Blueprint('messages', __name__, url_prefix='/messages')
 
-# Store active connections
-active_users = {}
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+
+def _message_dict(message, conversation):
+    return {
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'recipient_id': message.recipient_id,
+        'subject': message.subject,
+        'content': message.content,
+        'is_read': is_message_read(conversation, message),
+        'timestamp': message.created_at.isoformat() if message.created_at else None
+    }
+
+
+def _publish_read_receipt(conversation, reader_id, cursor):
+    """One receipt per cursor move, however many messages it covers"""
+    socketio.emit('messages_read', {
+        'reader_id': reader_id,
+        'up_to': cursor
+    }, to=user_room(conversation.other_user_id(reader_id)))
 
 
 @messages_bp.route('/', methods=['GET'])
@@ -31,27 +60,47 @@ def view_conversation(user_id):
     """View conversation with specific user"""
     other_user = User.query.get_or_404(user_id)
     
-    # Get all messages in conversation
-    messages = Message.query.filter(
-        ((Message.sender_id == current_user.id) & (Message.recipient_id == user_id)) |
-        ((Message.sender_id == user_id) & (Message.recipient_id == current_user.id))
-    ).order_by(Message.created_at.asc()).all()
-    
-    # Mark received messages as read
-    unread_messages = Message.query.filter_by(
-        recipient_id=current_user.id,
-        sender_id=user_id,
-        is_read=False
-    ).update({'is_read': True})
+    # Only the latest window; older messages are fetched on scroll from
+    # conversation_history
+    conversation = get_conversation(current_user.id, user_id)
+    messages, has_more = [], False
+    if conversation is not None:
+        messages, has_more = conversation_history(conversation, limit=HISTORY_PAGE_SIZE)
+
+    # Everything on screen is read: one cursor move, no per-message writes
+    conversation, cursor, advanced = advance_read_cursor(current_user.id, user_id)
     db.session.commit()
+    if advanced:
+        _publish_read_receipt(conversation, current_user.id, cursor)
     
     return render_template(
         'messages/conversation.html',
         other_user=other_user,
-        messages=messages
+        messages=messages,
+        has_more=has_more
     )
 
 
+@messages_bp.route('/conversation/<int:user_id>/history', methods=['GET'])
+@login_required
+def conversation_history_page(user_id):
+    """Older messages in a conversation, paged by message id cursor"""
+    before = request.args.get('before', type=int)
+    limit = max(1, min(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), HISTORY_MAX_PAGE_SIZE))
+    
+    conversation = get_conversation(current_user.id, user_id)
+    if conversation is None:
+        return jsonify({'success': True, 'messages': [], 'has_more': False, 'next_before': None})
+    
+    messages, has_more = conversation_history(conversation, before=before, limit=limit)
+    return jsonify({
+        'success': True,
+        'messages': [_message_dict(message, conversation) for message in messages],
+        'has_more': has_more,
+        'next_before': messages[0].id if messages else None
+    })
+
+
 @messages_bp.route('/send', methods=['POST'])
 @login_required
 def send_message():
@@ -65,6 +114,7 @@ def send_message():
             return jsonify({'error': 'Missing recipient_id or content'}), 400
         
         recipient = User.query.get_or_404(recipient_id)
+        recipient_id = recipient.id
         
         # Create message
         message = Message(
@@ -73,28 +123,29 @@ def send_message():
             content=content
         )
         
-        db.session.add(message)
+        record_message(message)
         
-        # Create notification for recipient
-        notification = Notification(
-            user_id=recipient_id,
-            title='New Message',
-            message=f'{current_user.full_name} sent you a message',
-            notification_type='message',
+        # Notify the recipient; unread messages reach email through digests
+        notify(
+            [recipient],
+            'New Message',
+            f'{current_user.full_name} sent you a message',
+            'message',
+            channel_names=('in_app', 'push'),
             related_message_id=message.id
         )
-        db.session.add(notification)
         
         db.session.commit()
         
-        # Emit to recipient if online
-        if recipient_id in active_users:
-            emit('new_message', {
-                'sender_id': current_user.id,
-                'sender_name': current_user.full_name,
-                'message': content,
-                'timestamp': message.created_at.isoformat()
-            }, room=active_users[recipient_id])
+        # Push to the recipient's personal room; the message queue carries it
+        # to whichever worker holds their connections
+        socketio.emit('new_message', {
+            'sender_id': current_user.id,
+            'sender_name': current_user.full_name,
+            'message': content,
+            'message_id': message.id,
+            'timestamp': message.created_at.isoformat()
+        }, to=user_room(recipient_id))
         
         return jsonify({
             'success': True,
@@ -110,7 +161,7 @@ def send_message():
 @messages_bp.route('/message/<int:message_id>/read', methods=['PUT'])
 @login_required
 def mark_as_read(message_id):
-    """Mark message as read"""
+    """Mark message (and everything before it in the conversation) as read"""
     try:
         message = Message.query.get_or_404(message_id)
         
@@ -118,10 +169,45 @@ def mark_as_read(message_id):
         if message.recipient_id != current_user.id:
             return jsonify({'error': 'Unauthorized'}), 403
         
-        message.is_read = True
+        conversation, cursor, advanced = advance_read_cursor(
+            current_user.id, message.sender_id, up_to_id=message.id
+        )
         db.session.commit()
+        if advanced:
+            _publish_read_receipt(conversation, current_user.id, cursor)
         
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'last_read_id': cursor})
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@messages_bp.route('/conversation/<int:user_id>/read', methods=['PUT'])
+@login_required
+def mark_conversation_read(user_id):
+    """Advance the read cursor, to `up_to` or the latest message"""
+    try:
+        data = request.get_json(silent=True) or {}
+        up_to = data.get('up_to')
+        if up_to is not None:
+            try:
+                up_to = int(up_to)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'up_to must be a message id'}), 400
+        
+        conversation, cursor, advanced = advance_read_cursor(current_user.id, user_id, up_to_id=up_to)
+        if conversation is None:
+            return jsonify({'error': 'Conversation not found'}), 404
+        db.session.commit()
+        if advanced:
+            _publish_read_receipt(conversation, current_user.id, cursor)
+        
+        return jsonify({
+            'success': True,
+            'last_read_id': cursor,
+            'unread_count': unread_count(conversation, current_user.id)
+        })
     
     except Exception as e:
         db.session.rollback()
@@ -139,6 +225,7 @@ def delete_message(message_id):
         if message.sender_id != current_user.id and message.recipient_id != current_user.id:
             return jsonify({'error': 'Unauthorized'}), 403
         
+        message_deleted(message)
         db.session.delete(message)
         db.session.commit()
         
@@ -153,39 +240,75 @@ def delete_message(message_id):
 @login_required
 def get_conversations():
     """Get list of conversations"""
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 20, type=int), 100)
+    
     try:
-        # Get unique users in conversations
-        messages = Message.query.filter(
-            (Message.sender_id == current_user.id) | (Message.recipient_id == current_user.id)
-        ).order_by(Message.created_at.desc()).all()
+        rows = conversation_list_query(current_user.id).limit(per_page).offset((page - 1) * per_page).all()
+        online = presence.online(*[row.other_user_id for row in rows])
         
-        conversations = {}
-        for msg in messages:
-            other_user_id = msg.recipient_id if msg.sender_id == current_user.id else msg.sender_id
-            
-            if other_user_id not in conversations:
-                other_user = User.query.get(other_user_id)
-                conversations[other_user_id] = {
-                    'user_id': other_user_id,
-                    'user_name': other_user.full_name,
-                    'last_message': msg.content,
-                    'last_message_time': msg.created_at.isoformat(),
-                    'unread_count': Message.query.filter_by(
-                        sender_id=other_user_id,
-                        recipient_id=current_user.id,
-                        is_read=False
-                    ).count()
-                }
+        conversations = [{
+            'conversation_id': row.id,
+            'user_id': row.other_user_id,
+            'user_name': row.other_user_name,
+            'last_message': row.last_message,
+            'last_message_time': row.last_message_at.isoformat() if row.last_message_at else None,
+            'unread_count': row.unread_count,
+            'online': row.other_user_id in online
+        } for row in rows]
         
         return jsonify({
             'success': True,
-            'conversations': list(conversations.values())
+            'page': page,
+            'per_page': per_page,
+            'has_more': len(conversations) == per_page,
+            'conversations': conversations
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@messages_bp.route('/search', methods=['GET'])
+@login_required
+def search():
+    """Full-text search across the current user's conversations"""
+    query = request.args.get('q', '').strip()
+    before = request.args.get('before', type=int)
+    limit = max(1, min(request.args.get('limit', 20, type=int), 50))
+    
+    if not query:
+        return jsonify({'error': 'Missing search query'}), 400
+    
+    try:
+        results, has_more = search_messages(current_user.id, query, before=before, limit=limit)
+        return jsonify({
+            'success': True,
+            'results': results,
+            'has_more': has_more,
+            'next_before': results[-1]['id'] if results else None
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@messages_bp.route('/presence', methods=['GET'])
+@login_required
+def get_presence():
+    """Bulk presence lookup, e.g. ?user_ids=3,7,12"""
+    try:
+        user_ids = [int(i) for i in request.args.get('user_ids', '').split(',') if i.strip()][:100]
+    except ValueError:
+        return jsonify({'error': 'user_ids must be a comma-separated list of ids'}), 400
+    
+    online = presence.online(*user_ids)
+    return jsonify({
+        'success': True,
+        'presence': {str(user_id): user_id in online for user_id in user_ids}
+    })
+
+
 @messages_bp.route('/send-booking-inquiry/<int:property_id>', methods=['POST'])
 @login_required
 def send_booking_inquiry(property_id):
@@ -204,28 +327,23 @@ def send_booking_inquiry(property_id):
             content=data.get('message', '')
         )
         
-        db.session.add(message)
+        record_message(message)
         
-        # Create notification for landlord
-        notification = Notification(
-            user_id=property.landlord_id,
-            title='New Property Inquiry',
-            message=f'{current_user.full_name} is interested in {property.title}',
-            notification_type='message'
+        # Notify the landlord (in-app, email and push)
+        notify(
+            [property.landlord],
+            'New Property Inquiry',
+            f'{current_user.full_name} is interested in {property.title}',
+            'message',
+            email=('property_inquiry', f'New Inquiry - {property.title}',
+                   {'tenant': current_user._get_current_object(), 'property': property,
+                    'message': data.get('message', '')}),
+            related_message_id=message.id
         )
-        db.session.add(notification)
         
-        db.session.commit()
+        track_funnel_event('property_inquiry', property.id, f'Inquiry about {property.title}')
         
-        # Send email to landlord
-        send_email(
-            recipient=property.landlord.email,
-            subject=f'New Inquiry - {property.title}',
-            template='property_inquiry',
-            tenant=current_user,
-            property=property,
-            message=data.get('message', '')
-        )
+        db.session.commit()
         
         return jsonify({
             'success': True,
@@ -245,27 +363,27 @@ def register_message_events(socketio):
     @socketio.on('connect')
     def handle_connect():
         """Handle user connection"""
-        from flask import session
         if current_user.is_authenticated:
-            active_users[current_user.id] = request.sid
-            emit('user_connected', {
-                'user_id': current_user.id,
-                'username': current_user.username
-            }, broadcast=True)
+            join_room(user_room(current_user.id))
+            presence.connect(current_user.id, request.sid)
     
     @socketio.on('disconnect')
     def handle_disconnect():
         """Handle user disconnection"""
         if current_user.is_authenticated:
-            active_users.pop(current_user.id, None)
-            emit('user_disconnected', {
-                'user_id': current_user.id
-            }, broadcast=True)
+            if presence.disconnect(current_user.id, request.sid):
+                typing_throttle.forget(current_user.id)
+    
+    @socketio.on('heartbeat')
+    def handle_heartbeat():
+        """Keep this connection's presence alive"""
+        if current_user.is_authenticated:
+            presence.heartbeat(current_user.id, request.sid)
     
     @socketio.on('join_conversation')
     def join_conversation(data):
         """Join conversation room"""
-        conversation_id = f"conv_{min(current_user.id, data['other_user_id'])}_{max(current_user.id, data['other_user_id'])}"
+        conversation_id = conversation_room(current_user.id, data['other_user_id'])
         join_room(conversation_id)
         emit('user_joined', {
             'user_id': current_user.id,
@@ -285,11 +403,11 @@ def register_message_events(socketio):
             content=content
         )
         
-        db.session.add(message)
+        record_message(message)
         db.session.commit()
         
         # Emit to both users
-        conversation_id = f"conv_{min(current_user.id, recipient_id)}_{max(current_user.id, recipient_id)}"
+        conversation_id = conversation_room(current_user.id, recipient_id)
         
         emit('message_received', {
             'sender_id': current_user.id,
@@ -299,23 +417,32 @@ def register_message_events(socketio):
             'message_id': message.id
         }, room=conversation_id)
     
-    @socketio.on('typing')
-    def handle_typing(data):
-        """Handle typing notification"""
-        recipient_id = data['recipient_id']
-        conversation_id = f"conv_{min(current_user.id, recipient_id)}_{max(current_user.id, recipient_id)}"
+    def _typing_changed(data, typing):
+        """Forward a typing state change to the conversation, if the throttle allows"""
+        if not current_user.is_authenticated:
+            return
+        conversation_id = conversation_room(current_user.id, data['recipient_id'])
+        if not typing_throttle.update(current_user.id, conversation_id, typing):
+            return
         
-        emit('user_typing', {
+        emit('typing_state', {
             'user_id': current_user.id,
-            'username': current_user.username
+            'username': current_user.username,
+            'typing': typing,
+            'expires_in': TYPING_TTL_SECONDS
         }, room=conversation_id, skip_sid=request.sid)
     
+    @socketio.on('typing_state')
+    def handle_typing_state(data):
+        """Handle typing state change ({'recipient_id', 'typing'})"""
+        _typing_changed(data, bool(data.get('typing')))
+    
+    @socketio.on('typing')
+    def handle_typing(data):
+        """Handle typing notification"""
+        _typing_changed(data, True)
+    
     @socketio.on('stop_typing')
     def handle_stop_typing(data):
         """Handle stop typing notification"""
-        recipient_id = data['recipient_id']
-        conversation_id = f"conv_{min(current_user.id, recipient_id)}_{max(current_user.id, recipient_id)}"
-        
-        emit('user_stop_typing', {
-            'user_id': current_user.id
-        }, room=conversation_id, skip_sid=request.sid)
+        _typing_changed(data, False)
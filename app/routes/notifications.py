@@ -0,0 +1,157 @@
+import json
+from flask import Blueprint, Response, jsonify, request, current_app
+from flask_login import login_required, current_user
+from app.models import db, NotificationPreference
+from app.utils.digest import DIGEST_FREQUENCIES, DEFAULT_DIGEST_FREQUENCY
+from app.utils.realtime import event_bus
+from app.utils.notifications import (
+    notification_channel, notification_dict, notifications_page,
+    unread_notification_count, mark_notifications_read, publish_unread_count
+)
+
+notifications_bp = Blueprint('notifications', __name__, url_prefix='/notifications')
+
+NOTIFICATIONS_PAGE_SIZE = 20
+NOTIFICATIONS_MAX_PAGE_SIZE = 100
+# NotificationPreference switches for the optional delivery channels
+NOTIFICATION_CHANNEL_FIELDS = ('email_notifications', 'push_notifications')
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@notifications_bp.route('/', methods=['GET'])
+@login_required
+def list_notifications():
+    """Newest notifications first, paged with ?before=<notification id>"""
+    before = request.args.get('before', type=int)
+    limit = max(1, min(request.args.get('limit', NOTIFICATIONS_PAGE_SIZE, type=int), NOTIFICATIONS_MAX_PAGE_SIZE))
+    unread_only = request.args.get('unread_only', '').lower() in ('1', 'true', 'yes')
+
+    notifications, has_more = notifications_page(current_user.id, before=before, limit=limit,
+                                                 unread_only=unread_only)
+    unread_count = unread_notification_count(current_user.id)
+    db.session.commit()
+
+    return jsonify({
+        'success': True,
+        'notifications': [notification_dict(n) for n in notifications],
+        'has_more': has_more,
+        'next_before': notifications[-1].id if notifications else None,
+        'unread_count': unread_count
+    })
+
+
+@notifications_bp.route('/unread-count', methods=['GET'])
+@login_required
+def unread_count():
+    """Cached unread counter - no COUNT over notifications"""
+    count = unread_notification_count(current_user.id)
+    db.session.commit()
+    return jsonify({'success': True, 'unread_count': count})
+
+
+@notifications_bp.route('/<int:notification_id>/read', methods=['POST'])
+@login_required
+def mark_read(notification_id):
+    """Mark one notification as read"""
+    try:
+        marked, count = mark_notifications_read(current_user.id, [notification_id])
+        db.session.commit()
+        if marked:
+            publish_unread_count(current_user.id, count)
+        return jsonify({'success': True, 'unread_count': count})
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@notifications_bp.route('/read-all', methods=['POST'])
+@login_required
+def mark_all_read():
+    """Mark every notification as read"""
+    try:
+        marked, count = mark_notifications_read(current_user.id)
+        db.session.commit()
+        publish_unread_count(current_user.id, count)
+        return jsonify({'success': True, 'marked': marked, 'unread_count': count})
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@notifications_bp.route('/preferences', methods=['GET', 'PUT'])
+@login_required
+def preferences():
+    """Read or update delivery preferences (digest frequency and channels)"""
+    preference = NotificationPreference.query.get(current_user.id)
+    
+    if request.method == 'PUT':
+        data = request.get_json(silent=True) or {}
+        frequency = data.get('digest_frequency')
+        if frequency is not None and frequency not in DIGEST_FREQUENCIES:
+            return jsonify({'error': f"digest_frequency must be one of: {', '.join(DIGEST_FREQUENCIES)}"}), 400
+        for field in NOTIFICATION_CHANNEL_FIELDS:
+            if field in data and not isinstance(data[field], bool):
+                return jsonify({'error': f'{field} must be true or false'}), 400
+        
+        try:
+            if preference is None:
+                preference = NotificationPreference(user_id=current_user.id, digest_frequency=DEFAULT_DIGEST_FREQUENCY,
+                                                    email_notifications=True, push_notifications=True)
+                db.session.add(preference)
+            if frequency is not None:
+                preference.digest_frequency = frequency
+            for field in NOTIFICATION_CHANNEL_FIELDS:
+                if field in data:
+                    setattr(preference, field, data[field])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'success': True,
+        'digest_frequency': preference.digest_frequency if preference else DEFAULT_DIGEST_FREQUENCY,
+        'last_digest_at': preference.last_digest_at.isoformat() if preference and preference.last_digest_at else None,
+        'email_notifications': preference.email_notifications if preference else True,
+        'push_notifications': preference.push_notifications if preference else True
+    })
+
+
+@notifications_bp.route('/stream', methods=['GET'])
+@login_required
+def stream():
+    """Server-Sent Events: new notifications and unread count changes"""
+    if not current_app.config.get('NOTIFICATION_STREAM_ENABLED'):
+        return jsonify({'error': 'Notification stream is disabled'}), 404
+    
+    user_id = current_user.id
+    keepalive = current_app.config.get('NOTIFICATION_STREAM_KEEPALIVE', 15)
+
+    # Subscribe before reading the count so nothing committed in between is missed
+    subscription = event_bus.listen(notification_channel(user_id))
+    count = unread_notification_count(user_id)
+    db.session.commit()
+
+    def events():
+        yield _sse('unread', {'unread_count': count})
+        while True:
+            message = subscription.get(timeout=keepalive)
+            if message is None:
+                yield ': keepalive\n\n'
+                continue
+            if isinstance(message, bytes):
+                message = message.decode('utf-8')
+            event = json.loads(message)
+            yield _sse(event['event'], event['data'])
+
+    response = Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    response.call_on_close(subscription.close)
+    return response
@@ -3,17 +3,21 @@ from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 import stripe
 import json
-from app.models import (
-    db, Payment, Invoice, PaymentSchedule, Booking, Property, 
-    Notification, User
-)
-from app.utils.email import send_email
-from app.utils.invoice_generator import generate_invoice_pdf
+from app.models import db, Payment, Invoice, PaymentSchedule, Booking, Property
+from app.utils.notification_dispatch import notify
+from app.utils.invoice_pdfs import invoice_pdfs, ready_invoice_pdf
+from app.utils.recurring_invoices import RECURRENCE_MONTHS, next_occurrence
+from app.utils.payment_schedules import upcoming_installments
 
 payments_bp = Blueprint('payments', __name__, url_prefix='/payments')
 
-# Initialize Stripe
-stripe.api_key = current_app.config.get('STRIPE_SECRET_KEY')
+INVOICE_PDF_RETRY_SECONDS = 2
+
+
+@payments_bp.record_once
+def init_stripe(state):
+    """Initialize Stripe once the blueprint is registered on an app"""
+    stripe.api_key = state.app.config.get('STRIPE_SECRET_KEY')
 
 
 # ==================== PAYMENT PROCESSING ====================
@@ -87,26 +91,17 @@ def confirm_payment():
             if booking:
                 booking.status = 'approved'
                 
-                # Create notification
-                notification = Notification(
-                    user_id=booking.user_id,
-                    title='Payment Confirmed',
-                    message=f'Your booking for {booking.property.title} has been confirmed!',
-                    notification_type='payment',
+                # Notify the tenant (in-app, email and push)
+                notify(
+                    [booking.user],
+                    'Payment Confirmed',
+                    f'Your booking for {booking.property.title} has been confirmed!',
+                    'payment',
+                    email=('payment_confirmation', f'Payment Confirmation - Booking #{booking_id}',
+                           {'booking': booking, 'payment': payment}),
                     related_payment_id=payment.id,
                     related_booking_id=booking_id
                 )
-                db.session.add(notification)
-                
-                # Send confirmation email
-                send_email(
-                    recipient=booking.user.email,
-                    subject=f'Payment Confirmation - Booking #{booking_id}',
-                    template='payment_confirmation',
-                    user=booking.user,
-                    booking=booking,
-                    payment=payment
-                )
             
             db.session.commit()
             
@@ -242,13 +237,25 @@ def download_invoice(invoice_id):
         flash('You do not have permission to download this invoice', 'danger')
         return redirect(url_for('payments.view_invoices'))
     
-    if not invoice.pdf_file:
-        # Generate PDF if not already generated
-        invoice.pdf_file = generate_invoice_pdf(invoice)
+    filename = ready_invoice_pdf(invoice)
+    if filename is None:
+        # Rendered in the background; the client retries shortly
+        invoice_pdfs.request([invoice.id])
+        if request.accept_mimetypes.best == 'application/json':
+            response = jsonify({'status': 'generating', 'retry_after': INVOICE_PDF_RETRY_SECONDS})
+        else:
+            # A browser gets a page that reloads this URL after the delay
+            response = current_app.make_response(render_template(
+                'invoices/generating.html', invoice=invoice, retry_after=INVOICE_PDF_RETRY_SECONDS))
+        response.headers['Retry-After'] = str(INVOICE_PDF_RETRY_SECONDS)
+        return response, 202
+    
+    if invoice.pdf_file != filename:
+        invoice.pdf_file = filename
         db.session.commit()
     
     # Return PDF file
-    return redirect(f'/static/uploads/{invoice.pdf_file}')
+    return redirect(f'/static/uploads/{filename}')
 
 
 @payments_bp.route('/invoice/<int:invoice_id>/mark-paid', methods=['POST'])
@@ -308,13 +315,9 @@ def create_recurring_invoice():
             status='draft'
         )
         
-        # Set next due date based on recurrence pattern
-        if invoice.recurrence_pattern == 'monthly':
-            invoice.next_due_date = invoice.due_date + timedelta(days=30)
-        elif invoice.recurrence_pattern == 'quarterly':
-            invoice.next_due_date = invoice.due_date + timedelta(days=90)
-        elif invoice.recurrence_pattern == 'yearly':
-            invoice.next_due_date = invoice.due_date + timedelta(days=365)
+        # Set next due date based on recurrence pattern (calendar months)
+        if invoice.recurrence_pattern in RECURRENCE_MONTHS:
+            invoice.next_due_date = next_occurrence(invoice.due_date, invoice.due_date, invoice.recurrence_pattern)
         
         db.session.add(invoice)
         db.session.commit()
@@ -361,6 +364,7 @@ def create_payment_schedule():
             payment_frequency=data.get('payment_frequency', 'monthly'),
             start_date=datetime.strptime(data.get('start_date'), '%Y-%m-%d'),
             end_date=datetime.strptime(data.get('end_date'), '%Y-%m-%d') if data.get('end_date') else None,
+            first_payment_date=datetime.strptime(data.get('first_payment_date'), '%Y-%m-%d'),
             next_payment_date=datetime.strptime(data.get('first_payment_date'), '%Y-%m-%d')
         )
         
@@ -378,6 +382,36 @@ def create_payment_schedule():
         return jsonify({'error': str(e)}), 500
 
 
+@payments_bp.route('/payment-schedule/<int:schedule_id>/installments', methods=['GET'])
+@login_required
+def schedule_installments(schedule_id):
+    """Billed installments of a schedule plus the next few, computed on the fly"""
+    schedule = PaymentSchedule.query.get_or_404(schedule_id)
+    
+    # Check authorization
+    if schedule.user_id != current_user.id and current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    billed = [{
+        'sequence': installment.sequence,
+        'due_date': installment.due_date.isoformat(),
+        'amount': installment.amount,
+        'status': installment.status,
+        'invoice_id': installment.invoice_id,
+        'payment_id': installment.payment_id
+    } for installment in schedule.installments]
+    
+    upcoming = [dict(installment, due_date=installment['due_date'].isoformat())
+                for installment in upcoming_installments(schedule)] if schedule.is_active else []
+    
+    return jsonify({
+        'scheduleId': schedule.id,
+        'status': schedule.status,
+        'installments': billed,
+        'upcoming': upcoming
+    })
+
+
 # ==================== FINANCIAL REPORTS ====================
 
 @payments_bp.route('/reports/earnings', methods=['GET'])
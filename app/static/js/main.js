@@ -13,6 +13,15 @@ document.addEventListener('DOMContentLoaded', function() {
     // Wishlist Toggle Functionality
     initWishlist();
 
+    // Comparable-property price hints on the property forms
+    initPriceSuggestion();
+
+    // Load older conversation messages on scroll
+    initConversationHistory();
+
+    // Live notification count
+    initNotificationStream();
+
     // Confirm delete actions
     const deleteButtons = document.querySelectorAll('[data-confirm-delete]');
     deleteButtons.forEach(button => {
@@ -287,6 +296,133 @@ function initWishlist() {
     });
 }
 
+// Price Suggestion Functionality
+function initPriceSuggestion() {
+    const form = document.querySelector('form[data-price-suggestion-url]');
+    const hint = document.getElementById('price-suggestion');
+    if (!form || !hint) return;
+    
+    const fields = ['city', 'province', 'property_type', 'bedrooms', 'bathrooms', 'amenities'];
+    let timeout = null;
+    
+    const refresh = () => {
+        const params = new URLSearchParams();
+        fields.forEach(name => {
+            const input = form.querySelector(`[name="${name}"]`);
+            if (input && input.value) params.append(name, input.value);
+        });
+        if (form.dataset.propertyId) params.append('property_id', form.dataset.propertyId);
+        if (!params.get('city') && !params.get('province')) return;
+        
+        fetch(`${form.dataset.priceSuggestionUrl}?${params.toString()}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    hint.textContent = `Comparable properties rent for ${formatCurrency(data.low)} - ${formatCurrency(data.high)} (suggested ${formatCurrency(data.suggested)})`;
+                } else {
+                    hint.textContent = '';
+                }
+            })
+            .catch(error => console.error('Error fetching price suggestion:', error));
+    };
+    
+    fields.forEach(name => {
+        const input = form.querySelector(`[name="${name}"]`);
+        if (!input) return;
+        input.addEventListener('change', () => {
+            clearTimeout(timeout);
+            timeout = setTimeout(refresh, 300);
+        });
+    });
+    
+    refresh();
+}
+
+function initConversationHistory() {
+    const thread = document.querySelector('[data-history-url]');
+    if (!thread || thread.dataset.hasMore !== 'true') return;
+    
+    let loading = false;
+    
+    const renderMessage = (message) => {
+        const item = document.createElement('div');
+        const own = String(message.sender_id) === thread.dataset.currentUserId;
+        item.className = `message ${own ? 'message-sent' : 'message-received'}`;
+        item.dataset.messageId = message.id;
+        
+        const content = document.createElement('div');
+        content.className = 'message-content';
+        content.textContent = message.content;
+        const time = document.createElement('small');
+        time.className = 'text-muted';
+        time.textContent = message.timestamp ? new Date(message.timestamp).toLocaleString() : '';
+        
+        item.append(content, time);
+        return item;
+    };
+    
+    const loadOlder = () => {
+        const oldest = thread.querySelector('[data-message-id]');
+        if (loading || thread.dataset.hasMore !== 'true' || !oldest) return;
+        loading = true;
+        
+        fetch(`${thread.dataset.historyUrl}?before=${oldest.dataset.messageId}`)
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) return;
+                // Keep the viewport on the same message while prepending
+                const previousHeight = thread.scrollHeight;
+                const fragment = document.createDocumentFragment();
+                data.messages.forEach(message => fragment.appendChild(renderMessage(message)));
+                thread.prepend(fragment);
+                thread.scrollTop += thread.scrollHeight - previousHeight;
+                thread.dataset.hasMore = data.has_more ? 'true' : 'false';
+            })
+            .catch(error => console.error('Error loading messages:', error))
+            .finally(() => { loading = false; });
+    };
+    
+    thread.addEventListener('scroll', () => {
+        if (thread.scrollTop < 100) loadOlder();
+    });
+}
+
+function initNotificationStream() {
+    const bell = document.querySelector('#notification-bell');
+    if (!bell) return;
+    const badge = bell.querySelector('.notification-count');
+    
+    const setCount = (count) => {
+        badge.textContent = count > 99 ? '99+' : count;
+        badge.classList.toggle('d-none', !count);
+    };
+    
+    // Without the stream (sync workers, old browsers) poll the unread count
+    if (!bell.dataset.notificationStreamUrl || !window.EventSource) {
+        const poll = () => {
+            if (document.hidden) return;
+            fetch(bell.dataset.notificationPollUrl)
+                .then(response => response.json())
+                .then(data => { if (data.success) setCount(data.unread_count); })
+                .catch(error => console.error('Error polling notifications:', error));
+        };
+        poll();
+        setInterval(poll, (parseInt(bell.dataset.notificationPollSeconds, 10) || 60) * 1000);
+        document.addEventListener('visibilitychange', poll);
+        return;
+    }
+    
+    // EventSource reconnects on its own; each connection starts with an
+    // 'unread' event carrying the current count
+    const source = new EventSource(bell.dataset.notificationStreamUrl);
+    source.addEventListener('unread', (e) => setCount(JSON.parse(e.data).unread_count));
+    source.addEventListener('notification', (e) => {
+        const notification = JSON.parse(e.data);
+        if (notification.unread_count !== null) setCount(notification.unread_count);
+        showNotification(notification.title, 'info');
+    });
+}
+
 // Export functions for use in other scripts
 window.appUtils = {
     formatCurrency,
@@ -0,0 +1,120 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy.engine import make_url
+from app.models import db, Message, ArchivedMessage, Conversation, Notification
+
+ARCHIVE_AFTER_DAYS = 180
+ARCHIVE_BATCH_SIZE = 1000
+
+_COPIED_COLUMNS = ('id', 'sender_id', 'recipient_id', 'conversation_id', 'subject', 'content',
+                   'is_read', 'is_archived', 'parent_message_id', 'created_at', 'updated_at')
+
+
+def default_archive_url(database_url):
+    """Archive bind URL when ARCHIVE_DATABASE_URL is unset.
+
+    A SQLite file gets a sibling `<name>_archive` file: a second engine on
+    the same file would have the archive and hot-table writes wait on each
+    other's locks. Other databases (and in-memory SQLite, which is
+    per-engine anyway) reuse the main URL.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return database_url
+    root, ext = os.path.splitext(url.database)
+    return url.set(database=f'{root}_archive{ext or ".db"}').render_as_string(hide_password=False)
+
+
+def _archivable(cutoff):
+    """Messages that can move to cold storage.
+
+    Old, read by their recipient, and either explicitly archived or in a
+    conversation that has itself gone quiet. A conversation's latest
+    message and any message a hot reply points at stay hot, so the summary
+    row and reply links never dangle.
+    """
+    read_cursor = db.case(
+        (Message.recipient_id == Conversation.user_low_id, Conversation.last_read_id_low),
+        else_=Conversation.last_read_id_high
+    )
+    reply = db.aliased(Message)
+    return db.session.query(Message).join(
+        Conversation, Conversation.id == Message.conversation_id
+    ).filter(
+        Message.created_at < cutoff,
+        Message.id <= read_cursor,
+        Message.id != Conversation.last_message_id,
+        db.or_(Message.is_archived.is_(True), Conversation.last_message_at < cutoff),
+        ~db.exists().where(reply.parent_message_id == Message.id)
+    )
+
+
+def archive_messages(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, max_batches=None):
+    """Move archivable messages from the hot table to messages_archive.
+
+    Each batch is copied (skipping ids already there) and committed on the
+    archive bind before the main database is touched; the conversations'
+    archive high-water marks and the hot-row delete then commit together.
+    The two binds never share a transaction, so they can't block each
+    other, and a crash between the steps leaves a message in both places
+    rather than in neither; reads de-duplicate and the next run finishes
+    the move. Returns the number of messages moved.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    moved = 0
+    batches = 0
+    after_id = 0
+
+    while max_batches is None or batches < max_batches:
+        # Keyset on id: old messages that must stay hot aren't re-read every batch
+        messages = _archivable(cutoff).filter(Message.id > after_id).order_by(Message.id).limit(batch_size).all()
+        if not messages:
+            break
+        batches += 1
+        ids = [message.id for message in messages]
+        after_id = ids[-1]
+        rows = [{column: getattr(message, column) for column in _COPIED_COLUMNS} for message in messages]
+        high_water = {}
+        for row in rows:
+            high_water[row['conversation_id']] = max(high_water.get(row['conversation_id'], 0), row['id'])
+        # End the read on the main database before writing the archive
+        db.session.commit()
+
+        already = {row[0] for row in db.session.query(ArchivedMessage.id).filter(ArchivedMessage.id.in_(ids))}
+        db.session.add_all([ArchivedMessage(**row) for row in rows if row['id'] not in already])
+        db.session.commit()
+
+        for conversation in Conversation.query.filter(Conversation.id.in_(list(high_water))):
+            conversation.archived_up_to_id = max(conversation.archived_up_to_id or 0, high_water[conversation.id])
+
+        # Old notifications lose their link rather than block the delete
+        Notification.query.filter(Notification.related_message_id.in_(ids)).update(
+            {'related_message_id': None}, synchronize_session=False)
+        Message.query.filter(Message.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        moved += len(ids)
+
+    return moved
+
+
+def merged_history(conversation, hot_rows, before, limit):
+    """Add cold messages to a page of hot history when they could belong on it.
+
+    `hot_rows` is the newest-first result of fetching `limit + 1` hot rows.
+    Cold storage is only read if the conversation has archived messages
+    that could fall inside this page's id window.
+    """
+    archived_up_to = conversation.archived_up_to_id or 0
+    if not archived_up_to:
+        return hot_rows
+    if len(hot_rows) > limit and archived_up_to < hot_rows[-1].id:
+        return hot_rows
+
+    query = ArchivedMessage.query.filter(ArchivedMessage.conversation_id == conversation.id)
+    if before is not None:
+        query = query.filter(ArchivedMessage.id < before)
+    cold_rows = query.order_by(ArchivedMessage.id.desc()).limit(limit + 1).all()
+
+    merged = {row.id: row for row in cold_rows}
+    merged.update({row.id: row for row in hot_rows})
+    return sorted(merged.values(), key=lambda row: row.id, reverse=True)[:limit + 1]
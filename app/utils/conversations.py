@@ -0,0 +1,239 @@
+from sqlalchemy import case
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Conversation, Message, User
+from app.utils.archival import merged_history
+
+
+def conversation_pair(user_a, user_b):
+    """Participants in the order they are stored on Conversation"""
+    return min(user_a, user_b), max(user_a, user_b)
+
+
+def conversation_room(user_a, user_b):
+    """Socket.IO room shared by both participants"""
+    low, high = conversation_pair(user_a, user_b)
+    return f"conv_{low}_{high}"
+
+
+def get_conversation(user_a, user_b):
+    low, high = conversation_pair(user_a, user_b)
+    return Conversation.query.filter_by(user_low_id=low, user_high_id=high).first()
+
+
+def get_or_create_conversation(user_a, user_b):
+    """Fetch the pair's conversation, creating it if needed.
+
+    Two first messages racing each other both try to insert; the loser's
+    savepoint is rolled back and it picks up the winner's row.
+    """
+    conversation = get_conversation(user_a, user_b)
+    if conversation is not None:
+        return conversation
+
+    low, high = conversation_pair(user_a, user_b)
+    try:
+        with db.session.begin_nested():
+            conversation = Conversation(user_low_id=low, user_high_id=high,
+                                        unread_count_low=0, unread_count_high=0,
+                                        last_read_id_low=0, last_read_id_high=0)
+            db.session.add(conversation)
+    except IntegrityError:
+        conversation = get_conversation(user_a, user_b)
+    return conversation
+
+
+def _unread_column(conversation, user_id):
+    return 'unread_count_low' if user_id == conversation.user_low_id else 'unread_count_high'
+
+
+def _cursor_column(conversation, user_id):
+    return 'last_read_id_low' if user_id == conversation.user_low_id else 'last_read_id_high'
+
+
+def read_cursor(conversation, user_id):
+    """Id of the last message `user_id` has read in the conversation"""
+    return getattr(conversation, _cursor_column(conversation, user_id)) or 0
+
+
+def unread_count(conversation, user_id):
+    return getattr(conversation, _unread_column(conversation, user_id)) or 0
+
+
+def is_message_read(conversation, message):
+    return message.id <= read_cursor(conversation, message.recipient_id)
+
+
+def record_message(message):
+    """Attach a new message to its conversation and bump the summary.
+
+    Runs inside the caller's transaction so the message and its summary
+    commit (or roll back) together. The unread counter is incremented in
+    SQL so concurrent senders can't lose updates.
+    """
+    conversation = get_or_create_conversation(message.sender_id, message.recipient_id)
+    message.conversation_id = conversation.id
+    db.session.add(message)
+    db.session.flush()
+
+    column = _unread_column(conversation, message.recipient_id)
+    Conversation.query.filter_by(id=conversation.id).update({
+        'last_message_id': message.id,
+        'last_message_at': message.created_at,
+        column: getattr(Conversation, column) + 1,
+    }, synchronize_session=False)
+    db.session.expire(conversation)
+    return conversation
+
+
+def _count_unread(conversation, user_id, cursor):
+    return db.session.query(db.func.count(Message.id)).filter(
+        Message.conversation_id == conversation.id,
+        Message.recipient_id == user_id,
+        Message.id > cursor
+    ).scalar()
+
+
+def advance_read_cursor(user_id, other_user_id, up_to_id=None):
+    """Move the user's read cursor forward to `up_to_id` (default: latest).
+
+    A single conditional UPDATE, so cursors only ever move forward however
+    requests from several tabs interleave; the unread counter is then
+    re-derived from the cursor. Returns (conversation, cursor, advanced).
+    """
+    conversation = get_conversation(user_id, other_user_id)
+    if conversation is None or conversation.last_message_id is None:
+        return conversation, 0, False
+
+    target = conversation.last_message_id
+    if up_to_id is not None:
+        target = min(up_to_id, target)
+
+    column = _cursor_column(conversation, user_id)
+    advanced = Conversation.query.filter(
+        Conversation.id == conversation.id,
+        getattr(Conversation, column) < target
+    ).update({column: target}, synchronize_session=False)
+    db.session.expire(conversation)
+
+    cursor = read_cursor(conversation, user_id)
+    if advanced:
+        setattr(conversation, _unread_column(conversation, user_id),
+                _count_unread(conversation, user_id, cursor))
+    return conversation, cursor, bool(advanced)
+
+
+def message_conversation(message):
+    return Conversation.query.get(message.conversation_id)
+
+
+def message_deleted(message):
+    """Fix up the summary after `message` has been deleted (same transaction)"""
+    if message.conversation_id is None:
+        return
+    conversation = message_conversation(message)
+    if conversation is None:
+        return
+
+    if not is_message_read(conversation, message):
+        column = _unread_column(conversation, message.recipient_id)
+        setattr(conversation, column, max((getattr(conversation, column) or 0) - 1, 0))
+
+    if conversation.last_message_id == message.id:
+        previous = db.session.query(Message.id, Message.created_at).filter(
+            Message.conversation_id == conversation.id,
+            Message.id != message.id
+        ).order_by(Message.id.desc()).first()
+        conversation.last_message_id = previous.id if previous else None
+        conversation.last_message_at = previous.created_at if previous else None
+
+
+def conversation_history(conversation, before=None, limit=50):
+    """One window of a conversation, newest `limit` messages below `before`.
+
+    Seeks on the (conversation_id, id) index rather than offsetting, so
+    every page costs the same however long the thread is, and falls
+    through to cold storage once the hot rows run out. Every message
+    carries a conversation_id (record_message sets it, and upgrade_schema
+    backfills older rows), so the seek needs no fallback. Returns the
+    messages oldest-first and whether older ones remain.
+    """
+    query = Message.query.filter(Message.conversation_id == conversation.id)
+    if before is not None:
+        query = query.filter(Message.id < before)
+    rows = query.order_by(Message.id.desc()).limit(limit + 1).all()
+    rows = merged_history(conversation, rows, before, limit)
+    has_more = len(rows) > limit
+    return rows[:limit][::-1], has_more
+
+
+def conversation_list_query(user_id):
+    """One indexed query returning a page-able list of the user's conversations"""
+    is_low = Conversation.user_low_id == user_id
+    other_id = case((is_low, Conversation.user_high_id), else_=Conversation.user_low_id)
+    unread = case((is_low, Conversation.unread_count_low), else_=Conversation.unread_count_high)
+
+    return db.session.query(
+        Conversation.id,
+        other_id.label('other_user_id'),
+        User.full_name.label('other_user_name'),
+        Message.content.label('last_message'),
+        Conversation.last_message_at,
+        unread.label('unread_count'),
+    ).join(
+        User, User.id == other_id
+    ).outerjoin(
+        Message, Message.id == Conversation.last_message_id
+    ).filter(
+        db.or_(Conversation.user_low_id == user_id, Conversation.user_high_id == user_id),
+        Conversation.last_message_id.isnot(None)
+    ).order_by(Conversation.last_message_at.desc(), Conversation.id.desc())
+
+
+def rebuild_conversations():
+    """Backfill conversation rows for messages written before they existed.
+
+    A one-off maintenance task: it walks every conversation, so it runs
+    from upgrade_schema() when messages.conversation_id is first added
+    (or from a shell), never in a request.
+    """
+    low = db.func.min(Message.sender_id, Message.recipient_id)
+    high = db.func.max(Message.sender_id, Message.recipient_id)
+    if db.engine.dialect.name != 'sqlite':
+        low = db.func.least(Message.sender_id, Message.recipient_id)
+        high = db.func.greatest(Message.sender_id, Message.recipient_id)
+
+    existing = {(c.user_low_id, c.user_high_id) for c in Conversation.query.with_entities(
+        Conversation.user_low_id, Conversation.user_high_id)}
+    pairs = db.session.query(low, high).distinct().all()
+    db.session.add_all([
+        Conversation(user_low_id=a, user_high_id=b, unread_count_low=0, unread_count_high=0)
+        for a, b in pairs if (a, b) not in existing
+    ])
+    db.session.flush()
+
+    conversation_ids = {(c.user_low_id, c.user_high_id): c.id for c in Conversation.query}
+    for (a, b), conversation_id in conversation_ids.items():
+        Message.query.filter(
+            db.or_(
+                db.and_(Message.sender_id == a, Message.recipient_id == b),
+                db.and_(Message.sender_id == b, Message.recipient_id == a)
+            )
+        ).update({'conversation_id': conversation_id}, synchronize_session=False)
+
+    for conversation in Conversation.query:
+        last = db.session.query(Message.id, Message.created_at).filter_by(
+            conversation_id=conversation.id
+        ).order_by(Message.id.desc()).first()
+        conversation.last_message_id = last.id if last else None
+        conversation.last_message_at = last.created_at if last else None
+        for user_id in (conversation.user_low_id, conversation.user_high_id):
+            # Read up to just before the first legacy unread message
+            first_unread = db.session.query(db.func.min(Message.id)).filter_by(
+                conversation_id=conversation.id, recipient_id=user_id, is_read=False
+            ).scalar()
+            cursor = first_unread - 1 if first_unread else (last.id if last else 0)
+            setattr(conversation, _cursor_column(conversation, user_id), cursor)
+            setattr(conversation, _unread_column(conversation, user_id),
+                    _count_unread(conversation, user_id, cursor))
+
+    db.session.commit()
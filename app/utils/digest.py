@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+from app.models import db, User, Message, Conversation, NotificationPreference
+from app.utils.email import mail, message_digest_email
+
+DIGEST_INTERVALS = {
+    'hourly': timedelta(hours=1),
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+}
+DIGEST_FREQUENCIES = ('off',) + tuple(DIGEST_INTERVALS)
+DEFAULT_DIGEST_FREQUENCY = 'daily'
+
+# Recipients handled per batch (a handful of queries each, however many users)
+DIGEST_BATCH_SIZE = 200
+# Senders listed individually in one email
+DIGEST_MAX_SENDERS = 5
+
+
+def _due(now):
+    """Users whose preferred interval has passed since their last digest"""
+    frequency = db.func.coalesce(NotificationPreference.digest_frequency, DEFAULT_DIGEST_FREQUENCY)
+    last = NotificationPreference.last_digest_at
+    return db.or_(*[
+        db.and_(frequency == name, db.or_(last.is_(None), last <= now - interval))
+        for name, interval in DIGEST_INTERVALS.items()
+    ])
+
+
+def _has_unread():
+    # Cheap pre-filter on the cached conversation counters
+    return db.exists().where(db.or_(
+        db.and_(Conversation.user_low_id == User.id, Conversation.unread_count_low > 0),
+        db.and_(Conversation.user_high_id == User.id, Conversation.unread_count_high > 0)
+    ))
+
+
+def _due_recipients(now, after_id, limit):
+    return db.session.query(User).outerjoin(
+        NotificationPreference, NotificationPreference.user_id == User.id
+    ).filter(
+        User.id > after_id,
+        User.is_active.isnot(False),
+        _due(now),
+        _has_unread()
+    ).order_by(User.id).limit(limit).all()
+
+
+def _unread_by_sender(user_ids):
+    """(recipient_id, sender_id, count, latest_id) for unread, undigested messages"""
+    read_cursor = db.case(
+        (Message.recipient_id == Conversation.user_low_id, Conversation.last_read_id_low),
+        else_=Conversation.last_read_id_high
+    )
+    return db.session.query(
+        Message.recipient_id,
+        Message.sender_id,
+        db.func.count(Message.id),
+        db.func.max(Message.id)
+    ).select_from(Conversation).join(
+        Message, db.and_(Message.conversation_id == Conversation.id, Message.id > read_cursor)
+    ).outerjoin(
+        NotificationPreference, NotificationPreference.user_id == Message.recipient_id
+    ).filter(
+        db.or_(Conversation.user_low_id.in_(user_ids), Conversation.user_high_id.in_(user_ids)),
+        Message.recipient_id.in_(user_ids),
+        Message.id > db.func.coalesce(NotificationPreference.last_digest_message_id, 0)
+    ).group_by(Message.recipient_id, Message.sender_id).all()
+
+
+def send_message_digests(now=None, batch_size=DIGEST_BATCH_SIZE):
+    """Email each due user one summary of their unread messages.
+
+    Runs a batch of recipients at a time: one query finds who is due, one
+    aggregates their unread messages per sender, two more fetch previews
+    and sender names. All emails in a batch share one SMTP connection.
+    Returns the number of digests sent.
+    """
+    now = now or datetime.utcnow()
+    sent = 0
+    after_id = 0
+
+    while True:
+        recipients = _due_recipients(now, after_id, batch_size)
+        if not recipients:
+            return sent
+        after_id = recipients[-1].id
+        recipient_ids = [user.id for user in recipients]
+
+        unread = {}
+        for recipient_id, sender_id, count, latest_id in _unread_by_sender(recipient_ids):
+            unread.setdefault(recipient_id, []).append((sender_id, count, latest_id))
+
+        latest_ids = [latest_id for rows in unread.values() for _, _, latest_id in rows]
+        previews = dict(db.session.query(Message.id, Message.content).filter(Message.id.in_(latest_ids)).all()) if latest_ids else {}
+        sender_ids = {sender_id for rows in unread.values() for sender_id, _, _ in rows}
+        names = dict(db.session.query(User.id, User.full_name).filter(User.id.in_(sender_ids)).all()) if sender_ids else {}
+
+        delivered = {}
+        with mail.connect() as connection:
+            for user in recipients:
+                rows = sorted(unread.get(user.id, []), key=lambda row: row[2], reverse=True)
+                if not rows:
+                    continue
+                summaries = [{
+                    'sender_name': names.get(sender_id, 'Someone'),
+                    'count': count,
+                    'preview': previews.get(latest_id, '')
+                } for sender_id, count, latest_id in rows[:DIGEST_MAX_SENDERS]]
+                try:
+                    connection.send(message_digest_email(user, summaries, sum(row[1] for row in rows)))
+                    delivered[user.id] = max(row[2] for row in rows)
+                except Exception as e:
+                    print(f"Error sending message digest to user {user.id}: {str(e)}")
+
+        if delivered:
+            preferences = {
+                preference.user_id: preference
+                for preference in NotificationPreference.query.filter(
+                    NotificationPreference.user_id.in_(list(delivered)))
+            }
+            for user_id, last_message_id in delivered.items():
+                preference = preferences.get(user_id)
+                if preference is None:
+                    preference = NotificationPreference(user_id=user_id, digest_frequency=DEFAULT_DIGEST_FREQUENCY)
+                    db.session.add(preference)
+                preference.last_digest_at = now
+                preference.last_digest_message_id = last_message_id
+            sent += len(delivered)
+        db.session.commit()
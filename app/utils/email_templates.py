@@ -0,0 +1,46 @@
+import os
+
+EMAIL_TEMPLATE_DIR = 'email'
+
+
+class EmailTemplateRegistry:
+    """Named email templates, compiled once at startup.
+
+    Each name maps to app/templates/email/<name>.html and an optional
+    <name>.txt plain-text part. The .html part is autoescaped, so user
+    content such as messages or booking notes is rendered as text and a
+    stray '{{' in it is harmless.
+    """
+
+    def __init__(self):
+        self.templates = {}
+
+    def init_app(self, app):
+        directory = os.path.join(app.root_path, app.template_folder, EMAIL_TEMPLATE_DIR)
+        names = sorted({os.path.splitext(filename)[0] for filename in os.listdir(directory)
+                        if filename.endswith(('.html', '.txt'))})
+        templates = {}
+        for name in names:
+            html = self._load(app, f'{name}.html', directory)
+            text = self._load(app, f'{name}.txt', directory)
+            templates[name] = (html, text)
+        self.templates = templates
+
+    def _load(self, app, filename, directory):
+        if not os.path.exists(os.path.join(directory, filename)):
+            return None
+        return app.jinja_env.get_template(f'{EMAIL_TEMPLATE_DIR}/{filename}')
+
+    def __contains__(self, name):
+        return name in self.templates
+
+    def render(self, name, **context):
+        """Render a registered template; returns (html, text), either may be None"""
+        html, text = self.templates[name]
+        return (
+            html.render(**context) if html is not None else None,
+            text.render(**context) if text is not None else None
+        )
+
+
+email_templates = EmailTemplateRegistry()
@@ -0,0 +1,135 @@
+import csv
+import json
+from datetime import date, datetime
+from sqlalchemy import or_
+from app.models import db, Booking, Payment, Invoice, Property, User
+
+# Rows fetched per round trip while streaming
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _landlord_property_ids(landlord_id):
+    """Subquery of property ids owned by a landlord (never materialized)"""
+    return db.session.query(Property.id).filter(Property.landlord_id == landlord_id)
+
+
+def bookings_export_query(landlord_id):
+    """Flat booking rows for a landlord's properties"""
+    return db.session.query(
+        Booking.id.label('booking_id'),
+        Property.id.label('property_id'),
+        Property.title.label('property_title'),
+        User.full_name.label('tenant_name'),
+        User.email.label('tenant_email'),
+        Booking.check_in_date,
+        Booking.check_out_date,
+        Booking.num_rooms,
+        Booking.total_price,
+        Booking.status,
+        Booking.created_at,
+    ).join(
+        Property, Property.id == Booking.property_id
+    ).join(
+        User, User.id == Booking.user_id
+    ).filter(
+        Property.landlord_id == landlord_id
+    ).order_by(Booking.id)
+
+
+def payments_export_query(landlord_id):
+    """Flat payment rows linked to a landlord's bookings or invoices"""
+    property_ids = _landlord_property_ids(landlord_id)
+    return db.session.query(
+        Payment.id.label('payment_id'),
+        Payment.booking_id,
+        Payment.invoice_id,
+        User.full_name.label('payer_name'),
+        User.email.label('payer_email'),
+        Payment.amount,
+        Payment.currency,
+        Payment.payment_method,
+        Payment.status,
+        Payment.description,
+        Payment.created_at,
+        Payment.completed_at,
+    ).join(
+        User, User.id == Payment.user_id
+    ).outerjoin(
+        Booking, Booking.id == Payment.booking_id
+    ).outerjoin(
+        Invoice, Invoice.id == Payment.invoice_id
+    ).filter(
+        or_(
+            Booking.property_id.in_(property_ids),
+            Invoice.property_id.in_(property_ids)
+        )
+    ).order_by(Payment.id)
+
+
+def invoices_export_query(landlord_id):
+    """Flat invoice rows for a landlord's properties"""
+    return db.session.query(
+        Invoice.id.label('invoice_id'),
+        Invoice.invoice_number,
+        Property.title.label('property_title'),
+        User.full_name.label('tenant_name'),
+        User.email.label('tenant_email'),
+        Invoice.invoice_type,
+        Invoice.description,
+        Invoice.amount,
+        Invoice.currency,
+        Invoice.status,
+        Invoice.issue_date,
+        Invoice.due_date,
+        Invoice.paid_date,
+    ).join(
+        Property, Property.id == Invoice.property_id
+    ).join(
+        User, User.id == Invoice.user_id
+    ).filter(
+        Property.landlord_id == landlord_id
+    ).order_by(Invoice.id)
+
+
+EXPORT_DATASETS = {
+    'bookings': bookings_export_query,
+    'payments': payments_export_query,
+    'invoices': invoices_export_query,
+}
+
+
+def _serialize(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class _LineBuffer:
+    """File-like object that hands back whatever csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def iter_export(query, fmt):
+    """Yield encoded export lines, fetching rows in batches.
+
+    Rows are plain column tuples, so nothing accumulates in the session
+    identity map and memory stays flat regardless of result size.
+    """
+    query = query.execution_options(stream_results=True).yield_per(EXPORT_BATCH_SIZE)
+    columns = [c['name'] for c in query.column_descriptions]
+
+    if fmt == 'csv':
+        writer = csv.writer(_LineBuffer())
+        yield writer.writerow(columns)
+        for row in query:
+            yield writer.writerow([_serialize(v) for v in row])
+    else:
+        for row in query:
+            yield json.dumps({c: _serialize(v) for c, v in zip(columns, row)}) + '\n'
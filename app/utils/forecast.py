@@ -0,0 +1,242 @@
+from datetime import datetime
+import numpy as np
+from app.models import db, Lease, PaymentSchedule, Booking, Property
+
+FORECAST_LEASE_STATUSES = ('active', 'renewal_pending')
+
+# Days between installments for day-based schedule frequencies
+FREQUENCY_DAYS = {
+    'weekly': 7,
+    'bi-weekly': 14,
+}
+
+
+def _as_days(values):
+    return np.array(values, dtype='datetime64[D]')
+
+
+def _ceil_div(a, b):
+    return -(-a // b)
+
+
+def _month_and_day(days):
+    """Split datetime64[D] values into (datetime64[M], zero-based day of month)"""
+    months = days.astype('datetime64[M]')
+    return months, (days - months.astype('datetime64[D]')).astype(int)
+
+
+def month_grid(start, months):
+    """Array of `months` consecutive calendar months starting at `start`"""
+    first = np.datetime64(start.strftime('%Y-%m'), 'M')
+    return first + np.arange(months)
+
+
+# ==================== LEASES ====================
+
+def lease_cash_flow(starts, ends, rents, auto_renew, grid):
+    """Monthly rent matrix (leases x months).
+
+    Rent falls due on each monthly anniversary of the start date that is
+    still before the end date. Auto-renewing leases are assumed to roll
+    over for the whole horizon.
+    """
+    start_m, start_dom = _month_and_day(_as_days(starts))
+    end_m, end_dom = _month_and_day(_as_days(ends))
+
+    # Day of month of the anniversary vs. the end date decides whether the
+    # final calendar month still has a payment due
+    last_m = end_m - (end_dom <= start_dom).astype(int)
+    last_m = np.where(auto_renew, grid[-1], last_m)
+
+    active = (grid[None, :] >= start_m[:, None]) & (grid[None, :] <= last_m[:, None])
+    return active * np.asarray(rents, dtype=float)[:, None]
+
+
+# ==================== PAYMENT SCHEDULES ====================
+
+def installment_counts(anchors, ends, frequencies, grid):
+    """Number of installments per (schedule, month) from each anchor date.
+
+    Day-based frequencies are counted arithmetically: the installments in
+    [lo, hi) are the k with anchor + k*step in that window, so no
+    individual dates are ever materialized. Open-ended schedules run to
+    the end of the grid.
+    """
+    anchor_days = _as_days(anchors)
+    last_day = (grid[-1] + 1).astype('datetime64[D]') - 1
+    end_days = np.array([last_day if e is None else np.datetime64(e, 'D') for e in ends], dtype='datetime64[D]')
+
+    month_start = grid.astype('datetime64[D]')
+    month_end = (grid + 1).astype('datetime64[D]')
+    counts = np.zeros((len(anchors), len(grid)), dtype=int)
+
+    steps = np.array([FREQUENCY_DAYS.get(f, 0) for f in frequencies])
+    by_day = steps > 0
+
+    if by_day.any():
+        a = anchor_days[by_day][:, None]
+        step = steps[by_day][:, None]
+        lo = np.maximum(month_start[None, :], a)
+        hi = np.minimum(month_end[None, :], end_days[by_day][:, None] + 1)
+        first = _ceil_div((lo - a).astype(int), step)
+        upto = _ceil_div((hi - a).astype(int), step)
+        counts[by_day] = np.clip(upto - first, 0, None)
+
+    monthly = ~by_day
+    if monthly.any():
+        a_m, a_dom = _month_and_day(anchor_days[monthly])
+        e_m, e_dom = _month_and_day(end_days[monthly])
+        last_m = e_m - (e_dom < a_dom).astype(int)
+        counts[monthly] = (
+            (grid[None, :] >= a_m[:, None]) & (grid[None, :] <= last_m[:, None])
+        ).astype(int)
+
+    return counts
+
+
+def installment_dates(anchors, sequences, frequencies):
+    """Due date (datetime64[D]) of installment `sequences` counted from each anchor.
+
+    Day-based frequencies step a fixed number of days; monthly schedules
+    land on the anchor's day of month, clamped to the end of shorter
+    months, without drifting after them.
+    """
+    anchor_days = _as_days(anchors)
+    sequences = np.asarray(sequences, dtype=int)
+    steps = np.array([FREQUENCY_DAYS.get(f, 0) for f in frequencies])
+
+    a_m, a_dom = _month_and_day(anchor_days)
+    months = a_m + sequences
+    month_length = ((months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(int)
+    monthly = months.astype('datetime64[D]') + np.minimum(a_dom, month_length - 1)
+
+    return np.where(steps > 0, anchor_days + sequences * steps, monthly)
+
+
+def installment_amounts(totals, starts, ends, frequencies):
+    """Per-installment amount for each schedule.
+
+    A schedule with an end date spreads `total_amount` evenly across every
+    installment from start to end; an open-ended schedule charges
+    `total_amount` on each installment.
+    """
+    amounts = np.asarray(totals, dtype=float).copy()
+    bounded = np.array([e is not None for e in ends])
+    if not bounded.any():
+        return amounts
+
+    start_days = _as_days([s for s, b in zip(starts, bounded) if b])
+    end_days = _as_days([e for e in ends if e is not None])
+    steps = np.array([FREQUENCY_DAYS.get(f, 0) for f, b in zip(frequencies, bounded) if b])
+
+    s_m, s_dom = _month_and_day(start_days)
+    e_m, e_dom = _month_and_day(end_days)
+    monthly_n = (e_m - s_m).astype(int) + (e_dom >= s_dom).astype(int)
+    daily_n = (end_days - start_days).astype(int) // np.maximum(steps, 1) + 1
+    n = np.where(steps > 0, daily_n, monthly_n)
+
+    amounts[bounded] = amounts[bounded] / np.maximum(n, 1)
+    return amounts
+
+
+# ==================== AGGREGATION ====================
+
+def _group_sum(keys, matrix):
+    """Sum matrix rows sharing the same key -> {key: monthly totals}"""
+    if not len(keys):
+        return {}
+    unique, inverse = np.unique(np.asarray(keys), return_inverse=True)
+    totals = np.zeros((len(unique), matrix.shape[1]))
+    np.add.at(totals, inverse, matrix)
+    return {int(k): totals[i] for i, k in enumerate(unique)}
+
+
+def forecast_cash_flow(start=None, months=12, landlord_id=None, property_id=None):
+    """Project expected income per month from leases and payment schedules.
+
+    Bookings covered by an active payment schedule are projected from the
+    schedule only, so rent is not counted twice.
+    """
+    start = start or datetime.utcnow()
+    grid = month_grid(start, months)
+    horizon_start = grid[0].astype('datetime64[D]').astype(datetime)
+
+    lease_query = db.session.query(
+        Lease.property_id,
+        Property.landlord_id,
+        Lease.start_date,
+        Lease.end_date,
+        Lease.monthly_rent,
+        Lease.auto_renew,
+    ).join(
+        Property, Property.id == Lease.property_id
+    ).filter(
+        Lease.status.in_(FORECAST_LEASE_STATUSES),
+        db.or_(Lease.auto_renew.is_(True), Lease.end_date >= horizon_start),
+        ~Lease.booking_id.in_(
+            db.session.query(PaymentSchedule.booking_id).filter(PaymentSchedule.is_active.is_(True))
+        )
+    )
+
+    schedule_query = db.session.query(
+        Booking.property_id,
+        Property.landlord_id,
+        PaymentSchedule.start_date,
+        PaymentSchedule.end_date,
+        PaymentSchedule.next_payment_date,
+        PaymentSchedule.total_amount,
+        PaymentSchedule.payment_frequency,
+    ).join(
+        Booking, Booking.id == PaymentSchedule.booking_id
+    ).join(
+        Property, Property.id == Booking.property_id
+    ).filter(
+        PaymentSchedule.is_active.is_(True),
+        db.or_(PaymentSchedule.end_date.is_(None), PaymentSchedule.end_date >= horizon_start)
+    )
+
+    if landlord_id:
+        lease_query = lease_query.filter(Property.landlord_id == landlord_id)
+        schedule_query = schedule_query.filter(Property.landlord_id == landlord_id)
+    if property_id:
+        lease_query = lease_query.filter(Property.id == property_id)
+        schedule_query = schedule_query.filter(Property.id == property_id)
+
+    leases = lease_query.all()
+    schedules = schedule_query.all()
+
+    lease_matrix = np.zeros((0, months))
+    if leases:
+        property_ids, landlord_ids, starts, ends, rents, auto_renew = zip(*leases)
+        lease_matrix = lease_cash_flow(starts, ends, rents, np.array(auto_renew, dtype=bool), grid)
+    else:
+        property_ids, landlord_ids = (), ()
+
+    schedule_matrix = np.zeros((0, months))
+    if schedules:
+        s_property_ids, s_landlord_ids, s_starts, s_ends, s_next, s_totals, s_freqs = zip(*schedules)
+        # Anchoring on the next due date means installments already paid
+        # are never projected again
+        counts = installment_counts(s_next, s_ends, s_freqs, grid)
+        amounts = installment_amounts(s_totals, s_starts, s_ends, s_freqs)
+        schedule_matrix = counts * amounts[:, None]
+    else:
+        s_property_ids, s_landlord_ids = (), ()
+
+    matrix = np.vstack([lease_matrix, schedule_matrix])
+    all_property_ids = list(property_ids) + list(s_property_ids)
+    all_landlord_ids = list(landlord_ids) + list(s_landlord_ids)
+
+    def _rounded(values):
+        return [round(float(v), 2) for v in values]
+
+    return {
+        'months': [str(m) for m in grid],
+        'total': _rounded(matrix.sum(axis=0)),
+        'from_leases': _rounded(lease_matrix.sum(axis=0)),
+        'from_schedules': _rounded(schedule_matrix.sum(axis=0)),
+        'by_landlord': {k: _rounded(v) for k, v in _group_sum(all_landlord_ids, matrix).items()},
+        'by_property': {k: _rounded(v) for k, v in _group_sum(all_property_ids, matrix).items()},
+        'lease_count': len(leases),
+        'schedule_count': len(schedules),
+    }
@@ -0,0 +1,162 @@
+from datetime import date, datetime
+from flask import request
+from flask_login import current_user
+from app.models import db, UserActivityLog, PropertyAnalytics, AnalyticsCheckpoint
+
+# Activity log actions that make up the view -> inquiry -> booking funnel,
+# mapped to the PropertyAnalytics counter each one feeds
+FUNNEL_ACTIONS = {
+    'view_property': 'total_views',
+    'property_inquiry': 'total_inquiries',
+    'create_booking': 'total_bookings',
+}
+
+FUNNEL_CHECKPOINT = 'funnel'
+
+# Log rows folded into the rollup per transaction
+FUNNEL_BATCH_SIZE = 5000
+
+
+def track_funnel_event(action, property_id, description=None):
+    """Record a funnel step for a property in the activity log.
+
+    The caller owns the transaction; the row is committed with whatever
+    else the request writes.
+    """
+    log = UserActivityLog(
+        user_id=current_user.id if current_user.is_authenticated else None,
+        action=action,
+        description=description,
+        ip_address=request.remote_addr,
+        user_agent=(request.user_agent.string or '')[:255],
+        resource_type='property',
+        resource_id=property_id
+    )
+    db.session.add(log)
+    return log
+
+
+def _to_date(value):
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def aggregate_funnel(batch_size=FUNNEL_BATCH_SIZE):
+    """Fold activity log rows written since the last run into PropertyAnalytics.
+
+    Only rows above the checkpoint's high-water mark are read, a batch at a
+    time. The checkpoint is advanced with a compare-and-set in the same
+    transaction as the counters, so concurrent runs never count a row twice.
+    Returns the number of log rows consumed.
+    """
+    consumed = 0
+    while True:
+        checkpoint = AnalyticsCheckpoint.query.get(FUNNEL_CHECKPOINT)
+        if checkpoint is None:
+            checkpoint = AnalyticsCheckpoint(name=FUNNEL_CHECKPOINT, last_processed_id=0)
+            db.session.add(checkpoint)
+            db.session.flush()
+        last_id = checkpoint.last_processed_id
+
+        upper_id = db.session.query(UserActivityLog.id).filter(
+            UserActivityLog.id > last_id
+        ).order_by(UserActivityLog.id).offset(batch_size - 1).limit(1).scalar()
+        if upper_id is None:
+            upper_id = db.session.query(db.func.max(UserActivityLog.id)).scalar() or last_id
+        if upper_id <= last_id:
+            db.session.commit()
+            return consumed
+
+        day = db.func.date(UserActivityLog.created_at)
+        rows = db.session.query(
+            UserActivityLog.resource_id, day, UserActivityLog.action, db.func.count(UserActivityLog.id)
+        ).filter(
+            UserActivityLog.id > last_id,
+            UserActivityLog.id <= upper_id,
+            UserActivityLog.action.in_(FUNNEL_ACTIONS),
+            UserActivityLog.resource_type == 'property',
+            UserActivityLog.resource_id.isnot(None)
+        ).group_by(UserActivityLog.resource_id, day, UserActivityLog.action).all()
+
+        increments = {}
+        for property_id, log_day, action, count in rows:
+            key = (property_id, _to_date(log_day))
+            increments.setdefault(key, {})[FUNNEL_ACTIONS[action]] = count
+
+        if increments:
+            property_ids = {key[0] for key in increments}
+            days = {key[1] for key in increments}
+            existing = {
+                (row.property_id, row.analytics_date): row
+                for row in PropertyAnalytics.query.filter(
+                    PropertyAnalytics.property_id.in_(property_ids),
+                    PropertyAnalytics.analytics_date.in_(days)
+                )
+            }
+            for key, counters in increments.items():
+                row = existing.get(key)
+                if row is None:
+                    row = PropertyAnalytics(property_id=key[0], analytics_date=key[1],
+                                            total_views=0, total_inquiries=0, total_bookings=0)
+                    db.session.add(row)
+                for column, count in counters.items():
+                    setattr(row, column, (getattr(row, column) or 0) + count)
+
+        claimed = AnalyticsCheckpoint.query.filter_by(
+            name=FUNNEL_CHECKPOINT, last_processed_id=last_id
+        ).update({'last_processed_id': upper_id}, synchronize_session=False)
+        if not claimed:
+            # Another worker consumed this range first
+            db.session.rollback()
+            continue
+
+        db.session.commit()
+        consumed += upper_id - last_id
+
+
+def funnel_report(property_ids, start, end):
+    """Per-property and per-day funnel counts with conversion rates"""
+    rows = db.session.query(
+        PropertyAnalytics.property_id,
+        PropertyAnalytics.analytics_date,
+        PropertyAnalytics.total_views,
+        PropertyAnalytics.total_inquiries,
+        PropertyAnalytics.total_bookings,
+    ).filter(
+        PropertyAnalytics.property_id.in_(property_ids),
+        PropertyAnalytics.analytics_date >= start,
+        PropertyAnalytics.analytics_date <= end
+    ).order_by(PropertyAnalytics.property_id, PropertyAnalytics.analytics_date).all()
+
+    def _rates(views, inquiries, bookings):
+        return {
+            'views': views,
+            'inquiries': inquiries,
+            'bookings': bookings,
+            'view_to_inquiry': round(inquiries / views * 100, 2) if views else 0,
+            'inquiry_to_booking': round(bookings / inquiries * 100, 2) if inquiries else 0,
+            'view_to_booking': round(bookings / views * 100, 2) if views else 0,
+        }
+
+    by_property = {}
+    totals = [0, 0, 0]
+    for property_id, analytics_date, views, inquiries, bookings in rows:
+        views, inquiries, bookings = views or 0, inquiries or 0, bookings or 0
+        entry = by_property.setdefault(property_id, {'days': [], 'counts': [0, 0, 0]})
+        entry['days'].append({'date': _to_date(analytics_date).isoformat(), **_rates(views, inquiries, bookings)})
+        for i, value in enumerate((views, inquiries, bookings)):
+            entry['counts'][i] += value
+            totals[i] += value
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'totals': _rates(*totals),
+        'properties': {
+            property_id: {'totals': _rates(*entry['counts']), 'days': entry['days']}
+            for property_id, entry in by_property.items()
+        },
+    }
@@ -4,77 +4,76 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from datetime import datetime
+from xml.sax.saxutils import escape
+import hashlib
+import json
 import os
+import re
+import tempfile
 from flask import current_app
 
 
-def generate_invoice_pdf(invoice):
-    """Generate PDF invoice"""
-    try:
-        # Create filename
-        filename = f"invoice_{invoice.invoice_number}_{datetime.utcnow().timestamp()}.pdf"
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        
-        # Create PDF document
-        doc = SimpleDocTemplate(filepath, pagesize=letter)
-        story = []
-        styles = getSampleStyleSheet()
-        
-        # Custom styles
-        title_style = ParagraphStyle(
+# Invoice fields that appear on the PDF; changing any of them needs a new render
+INVOICE_PDF_FIELDS = ('invoice_number', 'description', 'amount', 'currency', 'issue_date', 'due_date',
+                      'status', 'user_id')
+
+
+def invoice_snapshot(invoice):
+    """Everything the PDF shows, as plain (picklable, hashable) values"""
+    return {
+        'invoice_number': invoice.invoice_number,
+        'issue_date': invoice.issue_date.strftime('%Y-%m-%d'),
+        'due_date': invoice.due_date.strftime('%Y-%m-%d'),
+        'status': (invoice.status or '').upper(),
+        'user_name': invoice.user.full_name,
+        'user_email': invoice.user.email,
+        'description': invoice.description,
+        'amount': f"{invoice.amount:.2f}",
+        'currency': invoice.currency,
+    }
+
+
+def invoice_pdf_filename(snapshot):
+    """Content-addressed name: identical invoices map to the same file"""
+    digest = hashlib.sha256(json.dumps(snapshot, sort_keys=True).encode()).hexdigest()[:20]
+    number = re.sub(r'[^A-Za-z0-9_-]', '_', snapshot['invoice_number'])
+    return f"invoice_{number}_{digest}.pdf"
+
+
+def invoice_styles():
+    """Paragraph and table styles for invoices, built once and reused across renders"""
+    styles = getSampleStyleSheet()
+    return {
+        'normal': styles['Normal'],
+        'title': ParagraphStyle(
             'CustomTitle',
             parent=styles['Heading1'],
             fontSize=24,
             textColor=colors.HexColor('#1f4788'),
             spaceAfter=30,
             alignment=1  # Center alignment
-        )
-        
-        heading_style = ParagraphStyle(
+        ),
+        'heading': ParagraphStyle(
             'CustomHeading',
             parent=styles['Heading2'],
             fontSize=14,
             textColor=colors.HexColor('#1f4788'),
             spaceAfter=12
-        )
-        
-        # Title
-        story.append(Paragraph("INVOICE", title_style))
-        story.append(Spacer(1, 0.3*inch))
-        
-        # Invoice info table
-        invoice_info_data = [
-            ['Invoice Number:', invoice.invoice_number, 'Invoice Date:', invoice.issue_date.strftime('%Y-%m-%d')],
-            ['Due Date:', invoice.due_date.strftime('%Y-%m-%d'), 'Status:', invoice.status.upper()],
-        ]
-        
-        info_table = Table(invoice_info_data, colWidths=[2*inch, 2*inch, 2*inch, 2*inch])
-        info_table.setStyle(TableStyle([
+        ),
+        'footer': ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=9,
+            alignment=1,
+            textColor=colors.grey
+        ),
+        'info_table': TableStyle([
             ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
             ('FONTSIZE', (0, 0), (-1, -1), 10),
             ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
             ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E8EEF7')),
-        ]))
-        
-        story.append(info_table)
-        story.append(Spacer(1, 0.3*inch))
-        
-        # Bill To section
-        story.append(Paragraph("Bill To:", heading_style))
-        story.append(Paragraph(f"{invoice.user.full_name}<br/>{invoice.user.email}", styles['Normal']))
-        story.append(Spacer(1, 0.2*inch))
-        
-        # Invoice details table
-        details_data = [
-            ['Description', 'Amount', 'Currency'],
-            [invoice.description, f"${invoice.amount:.2f}", invoice.currency],
-        ]
-        
-        details_table = Table(details_data, colWidths=[3*inch, 1.5*inch, 1.5*inch])
-        details_table.setStyle(TableStyle([
+        ]),
+        'details_table': TableStyle([
             ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f4788')),
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
             ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
@@ -84,44 +83,129 @@ def generate_invoice_pdf(invoice):
             ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
             ('GRID', (0, 0), (-1, -1), 1, colors.black),
             ('RIGHTPADDING', (1, 0), (-1, -1), 10),
-        ]))
-        
-        story.append(details_table)
-        story.append(Spacer(1, 0.3*inch))
-        
-        # Total section
-        total_data = [
-            ['Total Amount:', f"${invoice.amount:.2f} {invoice.currency}"],
-        ]
-        
-        total_table = Table(total_data, colWidths=[4*inch, 2*inch])
-        total_table.setStyle(TableStyle([
+        ]),
+        'total_table': TableStyle([
             ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
             ('FONTSIZE', (0, 0), (-1, -1), 12),
             ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f4788')),
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
             ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
             ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-        ]))
-        
-        story.append(total_table)
-        story.append(Spacer(1, 0.5*inch))
-        
-        # Footer
-        footer_text = "Thank you for your business! | Amahle Rentals"
-        story.append(Paragraph(footer_text, ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=9,
-            alignment=1,
-            textColor=colors.grey
-        )))
-        
-        # Build PDF
+        ]),
+    }
+
+
+def render_invoice_pdf(snapshot, filepath, styles=None):
+    """Render an invoice snapshot to `filepath` (written atomically)"""
+    styles = styles or invoice_styles()
+    # Unique per call: the background queue, drain() and batch workers may
+    # render the same invoice at the same time
+    handle, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=f'{os.path.basename(filepath)}.',
+                                        dir=os.path.dirname(filepath) or None)
+    os.close(handle)
+    
+    # Create PDF document
+    doc = SimpleDocTemplate(tmp_path, pagesize=letter)
+    story = []
+    
+    # Title
+    story.append(Paragraph("INVOICE", styles['title']))
+    story.append(Spacer(1, 0.3*inch))
+    
+    # Invoice info table
+    invoice_info_data = [
+        ['Invoice Number:', snapshot['invoice_number'], 'Invoice Date:', snapshot['issue_date']],
+        ['Due Date:', snapshot['due_date'], 'Status:', snapshot['status']],
+    ]
+    
+    info_table = Table(invoice_info_data, colWidths=[2*inch, 2*inch, 2*inch, 2*inch])
+    info_table.setStyle(styles['info_table'])
+    
+    story.append(info_table)
+    story.append(Spacer(1, 0.3*inch))
+    
+    # Bill To section
+    story.append(Paragraph("Bill To:", styles['heading']))
+    story.append(Paragraph(f"{escape(snapshot['user_name'])}<br/>{escape(snapshot['user_email'])}", styles['normal']))
+    story.append(Spacer(1, 0.2*inch))
+    
+    # Invoice details table
+    details_data = [
+        ['Description', 'Amount', 'Currency'],
+        [snapshot['description'], f"${snapshot['amount']}", snapshot['currency']],
+    ]
+    
+    details_table = Table(details_data, colWidths=[3*inch, 1.5*inch, 1.5*inch])
+    details_table.setStyle(styles['details_table'])
+    
+    story.append(details_table)
+    story.append(Spacer(1, 0.3*inch))
+    
+    # Total section
+    total_data = [
+        ['Total Amount:', f"${snapshot['amount']} {snapshot['currency']}"],
+    ]
+    
+    total_table = Table(total_data, colWidths=[4*inch, 2*inch])
+    total_table.setStyle(styles['total_table'])
+    
+    story.append(total_table)
+    story.append(Spacer(1, 0.5*inch))
+    
+    # Footer
+    footer_text = "Thank you for your business! | Amahle Rentals"
+    story.append(Paragraph(footer_text, styles['footer']))
+    
+    # Build PDF
+    try:
         doc.build(story)
-        
-        return filename
+        os.replace(tmp_path, filepath)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+# Styles prebuilt once per batch worker process (see init_render_worker)
+_worker_styles = None
+
+
+def init_render_worker():
+    """ProcessPoolExecutor initializer: build the styles once per process"""
+    global _worker_styles
+    _worker_styles = invoice_styles()
+
+
+def render_invoice_task(task):
+    """Batch worker entry point: (invoice_id, snapshot, filepath) -> (invoice_id, error or None)"""
+    invoice_id, snapshot, filepath = task
+    try:
+        render_invoice_pdf(snapshot, filepath, _worker_styles)
+        return invoice_id, None
+    except Exception as e:
+        return invoice_id, str(e)
+
+
+def ensure_invoice_pdf(invoice, upload_folder=None):
+    """Point invoice.pdf_file at an up-to-date PDF, rendering only if no
+    file with identical content exists yet. Returns the filename (the
+    caller commits)."""
+    upload_folder = upload_folder or current_app.config['UPLOAD_FOLDER']
+    snapshot = invoice_snapshot(invoice)
+    filename = invoice_pdf_filename(snapshot)
+    filepath = os.path.join(upload_folder, filename)
     
+    if not os.path.exists(filepath):
+        os.makedirs(upload_folder, exist_ok=True)
+        render_invoice_pdf(snapshot, filepath)
+    if invoice.pdf_file != filename:
+        invoice.pdf_file = filename
+    return filename
+
+
+def generate_invoice_pdf(invoice):
+    """Generate PDF invoice"""
+    try:
+        return ensure_invoice_pdf(invoice)
     except Exception as e:
         print(f"Error generating invoice PDF: {str(e)}")
         return None
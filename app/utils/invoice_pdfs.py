@@ -0,0 +1,269 @@
+import multiprocessing
+import os
+import threading
+import click
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session, joinedload
+from app.models import db, Invoice
+from app.utils.invoice_generator import (
+    INVOICE_PDF_FIELDS, ensure_invoice_pdf, invoice_snapshot, invoice_pdf_filename,
+    init_render_worker, render_invoice_task
+)
+
+_PENDING_KEY = 'invoice_pdfs_to_render'
+
+INVOICE_PDF_WORKERS = 1
+# Batch rendering: invoices loaded per query, and pdf_file updates per commit
+INVOICE_BATCH_QUERY_SIZE = 500
+INVOICE_BATCH_FLUSH_SIZE = 200
+# Set in the environment of the batch renderer's worker processes; an app
+# built there (spawn re-imports the main module) starts no background workers
+RENDER_WORKER_ENV = 'INVOICE_RENDER_WORKER'
+
+
+class InvoicePdfQueue:
+    """Renders invoice PDFs off the request path.
+
+    Invoices are queued when created or when a field shown on the PDF
+    changes (once the change commits). With INVOICE_PDF_WORKERS = 0 nothing
+    runs in the background and `drain()` renders whatever is pending.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        workers = app.config.get('INVOICE_PDF_WORKERS', INVOICE_PDF_WORKERS)
+        if workers > 0 and self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='invoice-pdf')
+        app.cli.add_command(render_invoice_pdfs_command)
+
+    def request(self, invoice_ids):
+        """Queue invoices for rendering; ids already waiting are skipped"""
+        with self._lock:
+            new_ids = set(invoice_ids) - self._pending
+            self._pending |= new_ids
+        if self.executor is not None:
+            for invoice_id in new_ids:
+                self.executor.submit(self._run, invoice_id)
+
+    def _run(self, invoice_id):
+        # Un-mark first, so a change committed while rendering queues it again
+        with self._lock:
+            self._pending.discard(invoice_id)
+        with self.app.app_context():
+            try:
+                self.render(invoice_id)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error generating invoice PDF {invoice_id}: {str(e)}")
+            finally:
+                db.session.remove()
+
+    def render(self, invoice_id):
+        invoice = Invoice.query.options(joinedload(Invoice.user)).get(invoice_id)
+        if invoice is None:
+            return None
+        filename = ensure_invoice_pdf(invoice)
+        db.session.commit()
+        return filename
+
+    def drain(self):
+        """Render everything pending in the calling thread; returns the count"""
+        with self._lock:
+            invoice_ids, self._pending = self._pending, set()
+        for invoice_id in sorted(invoice_ids):
+            try:
+                self.render(invoice_id)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error generating invoice PDF {invoice_id}: {str(e)}")
+        return len(invoice_ids)
+
+
+def ready_invoice_pdf(invoice):
+    """Filename of an up-to-date PDF for the invoice, or None if it still needs rendering"""
+    filename = invoice_pdf_filename(invoice_snapshot(invoice))
+    if os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], filename)):
+        return filename
+    return None
+
+
+def _batch_tasks(invoice_ids, upload_folder):
+    """Per keyset batch: (render tasks for missing PDFs, {id: (pdf_file, reusable filename)}).
+
+    Invoices this loads are expunged again once snapshotted; ones the
+    caller's session already held are left alone.
+    """
+    query = Invoice.query.options(joinedload(Invoice.user))
+    if invoice_ids is not None:
+        query = query.filter(Invoice.id.in_(list(invoice_ids)))
+    after_id = 0
+    while True:
+        held = set(db.session.identity_map.keys())
+        invoices = query.filter(Invoice.id > after_id).order_by(Invoice.id).limit(INVOICE_BATCH_QUERY_SIZE).all()
+        if not invoices:
+            return
+        after_id = invoices[-1].id
+        tasks, reused = [], {}
+        for invoice in invoices:
+            snapshot = invoice_snapshot(invoice)
+            filename = invoice_pdf_filename(snapshot)
+            filepath = os.path.join(upload_folder, filename)
+            if os.path.exists(filepath):
+                reused[invoice.id] = (invoice.pdf_file, filename)
+            else:
+                tasks.append((invoice.id, snapshot, filepath))
+            if db.inspect(invoice).identity_key not in held:
+                db.session.expunge(invoice)
+        yield tasks, reused
+
+
+def _flush_pdf_files(updates):
+    if updates:
+        db.session.execute(update(Invoice), [
+            {'id': invoice_id, 'pdf_file': filename} for invoice_id, filename in updates.items()
+        ])
+        db.session.commit()
+        updates.clear()
+
+
+def _render_pool(workers):
+    # 'spawn' so workers don't inherit this process's threads and connections
+    context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_render_worker)
+
+
+def render_invoice_pdfs(invoice_ids=None, workers=None):
+    """Render many invoice PDFs across a process pool (e.g. at month end).
+
+    Renders the given invoices, or every invoice without an up-to-date PDF.
+    Each keyset batch goes to the pool as soon as it is read (at most two
+    batches in flight) and results are collected as they finish, with
+    pdf_file updated in bulk every INVOICE_BATCH_FLUSH_SIZE invoices. Each
+    worker process builds the ReportLab styles once. With a single worker
+    (one CPU) the PDFs are rendered in this process instead, which is
+    faster than a pool of one. Returns counts of rendered, reused and
+    failed PDFs.
+
+    Workers are started with 'spawn', which re-imports the calling
+    process's main module in each of them; RENDER_WORKER_ENV keeps an app
+    built there from starting background workers. Meant for the
+    `flask render-invoice-pdfs` command, not requests or scheduled jobs.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(upload_folder, exist_ok=True)
+    workers = workers or current_app.config.get('INVOICE_BATCH_WORKERS') or os.cpu_count() or 1
+    stats = {'rendered': 0, 'reused': 0, 'failed': 0}
+    filenames, updates = {}, {}
+
+    def collect(results):
+        for invoice_id, error in results:
+            filename = filenames.pop(invoice_id)
+            if error:
+                stats['failed'] += 1
+                print(f"Error generating invoice PDF {invoice_id}: {error}")
+                continue
+            stats['rendered'] += 1
+            updates[invoice_id] = filename
+            if len(updates) >= INVOICE_BATCH_FLUSH_SIZE:
+                _flush_pdf_files(updates)
+
+    executor = None
+    in_flight = set()
+    previous_env = os.environ.get(RENDER_WORKER_ENV)
+    if workers <= 1:
+        init_render_worker()
+    try:
+        for tasks, reused in _batch_tasks(invoice_ids, upload_folder):
+            stats['reused'] += len(reused)
+            updates.update({invoice_id: filename for invoice_id, (current, filename) in reused.items() if current != filename})
+            filenames.update({invoice_id: os.path.basename(filepath) for invoice_id, _, filepath in tasks})
+            if not tasks:
+                continue
+            if workers <= 1:
+                collect(render_invoice_task(task) for task in tasks)
+                continue
+            if executor is None:
+                # Inherited by every worker process the pool spawns
+                os.environ[RENDER_WORKER_ENV] = '1'
+                executor = _render_pool(workers)
+            in_flight |= {executor.submit(render_invoice_task, task) for task in tasks}
+            while len(in_flight) > INVOICE_BATCH_QUERY_SIZE:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(future.result() for future in done)
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(future.result() for future in done)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+            if previous_env is None:
+                os.environ.pop(RENDER_WORKER_ENV, None)
+            else:
+                os.environ[RENDER_WORKER_ENV] = previous_env
+    _flush_pdf_files(updates)
+    return stats
+
+
+def queue_created_invoice_pdfs(invoice_ids):
+    """Queue PDFs for bulk-inserted invoices, which bypass the invoice hooks.
+
+    They go to the background renderer rather than the batch pool, so a
+    scheduled job never blocks on (or spawns processes for) rendering.
+    """
+    if invoice_ids:
+        invoice_pdfs.request(invoice_ids)
+
+
+@click.command('render-invoice-pdfs')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: one per CPU)')
+@click.argument('invoice_ids', nargs=-1, type=int)
+@with_appcontext
+def render_invoice_pdfs_command(workers, invoice_ids):
+    """Render invoice PDFs in bulk (e.g. at month end); all invoices without an up-to-date PDF by default"""
+    stats = render_invoice_pdfs(list(invoice_ids) or None, workers=workers)
+    click.echo(f"Rendered {stats['rendered']}, reused {stats['reused']}, failed {stats['failed']}")
+
+
+def _queue_for_render(session, invoice):
+    session.info.setdefault(_PENDING_KEY, set()).add(invoice.id)
+
+
+@event.listens_for(Invoice, 'after_insert')
+def _invoice_created(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        _queue_for_render(session, target)
+
+
+@event.listens_for(Invoice, 'after_update')
+def _invoice_changed(mapper, connection, target):
+    state = db.inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in INVOICE_PDF_FIELDS):
+        session = Session.object_session(target)
+        if session is not None:
+            _queue_for_render(session, target)
+
+
+@event.listens_for(Session, 'after_commit')
+def _render_committed_invoices(session):
+    invoice_ids = session.info.pop(_PENDING_KEY, None)
+    if invoice_ids and invoice_pdfs.app is not None:
+        invoice_pdfs.request(invoice_ids)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_rolled_back_invoices(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+
+
+invoice_pdfs = InvoicePdfQueue()
@@ -0,0 +1,168 @@
+import re
+from html import escape
+from sqlalchemy import text
+from app.models import db, Message, ArchivedMessage
+
+# Highlight sentinels: snippets are built with these, HTML-escaped, and only
+# then turned into <mark> tags, so message text can never inject markup
+_HIGHLIGHT_START = '⟦'
+_HIGHLIGHT_END = '⟧'
+SNIPPET_TOKENS = 12
+
+# Hot messages and their cold copies in messages_archive (on the archive
+# bind); both are indexed and searched so archived messages stay findable
+SEARCHED_MODELS = (Message, ArchivedMessage)
+
+
+def _sqlite_setup(table):
+    fts = f'{table}_fts'
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            subject, content, content='{table}', content_rowid='id', tokenize='unicode61'
+        )""",
+        # External-content FTS5 table kept in step by triggers, so every write
+        # path (routes, socket handlers, admin, archival) updates the index
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, subject, content) VALUES (new.id, new.subject, new.content);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, subject, content)
+            VALUES ('delete', old.id, old.subject, old.content);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF subject, content ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, subject, content)
+            VALUES ('delete', old.id, old.subject, old.content);
+            INSERT INTO {fts}(rowid, subject, content) VALUES (new.id, new.subject, new.content);
+        END""",
+    ]
+
+
+def _postgres_document(alias=''):
+    prefix = f'{alias}.' if alias else ''
+    return f"to_tsvector('simple', coalesce({prefix}subject, '') || ' ' || {prefix}content)"
+
+
+def ensure_message_search_index():
+    """Create the full-text indexes if missing (idempotent; run at startup)"""
+    for model in SEARCHED_MODELS:
+        table = model.__tablename__
+        engine = db.session.get_bind(mapper=model)
+        with engine.begin() as connection:
+            if engine.dialect.name == 'sqlite':
+                exists = connection.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+                ), {'name': f'{table}_fts'}).first()
+                for statement in _sqlite_setup(table):
+                    connection.execute(text(statement))
+                if not exists:
+                    # Index rows written before the table existed
+                    connection.execute(text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+            elif engine.dialect.name == 'postgresql':
+                # Expression index; PostgreSQL maintains it on every write
+                connection.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table}_fts ON {table} USING GIN ({_postgres_document()})"
+                ))
+
+
+def _terms(query):
+    return re.findall(r'\w+', query or '', flags=re.UNICODE)[:10]
+
+
+def _highlight(snippet):
+    return escape(snippet or '').replace(_HIGHLIGHT_START, '<mark>').replace(_HIGHLIGHT_END, '</mark>')
+
+
+def _page_filter(before):
+    # Only messages the user sent or received, below the cursor
+    clause = "(m.sender_id = :user_id OR m.recipient_id = :user_id)"
+    return clause + (" AND m.id < :before" if before is not None else "")
+
+
+def _search_sqlite(model, user_id, terms, before, limit):
+    # Each word is quoted (no FTS syntax from user input) and prefix-matched
+    table = model.__tablename__
+    match = ' '.join(f'"{term}"*' for term in terms)
+    sql = f"""
+        SELECT m.id, m.sender_id, m.recipient_id, m.conversation_id, m.subject, m.created_at,
+               snippet({table}_fts, -1, :start, :end, '...', :tokens) AS snippet
+        FROM {table}_fts JOIN {table} m ON m.id = {table}_fts.rowid
+        WHERE {table}_fts MATCH :match AND {_page_filter(before)}
+        ORDER BY m.id DESC
+        LIMIT :limit
+    """
+    return db.session.execute(text(sql).columns(created_at=db.DateTime), {
+        'match': match, 'user_id': user_id, 'before': before, 'limit': limit,
+        'start': _HIGHLIGHT_START, 'end': _HIGHLIGHT_END, 'tokens': SNIPPET_TOKENS
+    }, bind_arguments={'mapper': model}).mappings().all()
+
+
+def _search_postgres(model, user_id, terms, before, limit):
+    query = ' & '.join(f"{term}:*" for term in terms)
+    sql = f"""
+        SELECT m.id, m.sender_id, m.recipient_id, m.conversation_id, m.subject, m.created_at,
+               ts_headline('simple', m.content, q, :options) AS snippet
+        FROM {model.__tablename__} m, to_tsquery('simple', :query) q
+        WHERE {_postgres_document('m')} @@ q AND {_page_filter(before)}
+        ORDER BY m.id DESC
+        LIMIT :limit
+    """
+    return db.session.execute(text(sql).columns(created_at=db.DateTime), {
+        'query': query, 'user_id': user_id, 'before': before, 'limit': limit,
+        'options': f'StartSel={_HIGHLIGHT_START}, StopSel={_HIGHLIGHT_END}, MaxWords={SNIPPET_TOKENS * 2}, MinWords={SNIPPET_TOKENS // 2}'
+    }, bind_arguments={'mapper': model}).mappings().all()
+
+
+def _search_fallback(model, user_id, terms, before, limit):
+    query = model.query.filter(
+        db.or_(model.sender_id == user_id, model.recipient_id == user_id)
+    )
+    for term in terms:
+        query = query.filter(db.or_(model.content.ilike(f'%{term}%'), model.subject.ilike(f'%{term}%')))
+    if before is not None:
+        query = query.filter(model.id < before)
+
+    rows = []
+    pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+    for message in query.order_by(Message.id.desc()).limit(limit):
+        snippet = pattern.sub(lambda m: f'{_HIGHLIGHT_START}{m.group(0)}{_HIGHLIGHT_END}', message.content)
+        rows.append({
+            'id': message.id, 'sender_id': message.sender_id, 'recipient_id': message.recipient_id,
+            'conversation_id': message.conversation_id, 'subject': message.subject,
+            'created_at': message.created_at, 'snippet': snippet[:300]
+        })
+    return rows
+
+
+def search_messages(user_id, query, before=None, limit=20):
+    """Full-text search over messages the user sent or received.
+
+    Newest matches first; pass the last result's id as `before` for the
+    next page. Archived messages are searched alongside hot ones (a row
+    briefly in both during archival is returned once). Returns (results,
+    has_more) with HTML-safe, highlighted snippets.
+    """
+    terms = _terms(query)
+    if not terms:
+        return [], False
+
+    found = {}
+    for model in SEARCHED_MODELS:
+        dialect = db.session.get_bind(mapper=model).dialect.name
+        search = {'sqlite': _search_sqlite, 'postgresql': _search_postgres}.get(dialect, _search_fallback)
+        for row in search(model, user_id, terms, before, limit + 1):
+            found.setdefault(row['id'], row)
+    rows = sorted(found.values(), key=lambda row: row['id'], reverse=True)
+
+    results = []
+    for row in rows[:limit]:
+        results.append({
+            'id': row['id'],
+            'sender_id': row['sender_id'],
+            'recipient_id': row['recipient_id'],
+            'other_user_id': row['recipient_id'] if row['sender_id'] == user_id else row['sender_id'],
+            'conversation_id': row['conversation_id'],
+            'subject': row['subject'],
+            'snippet': _highlight(row['snippet']),
+            'timestamp': row['created_at'].isoformat() if row['created_at'] else None
+        })
+    return results, len(rows) > limit
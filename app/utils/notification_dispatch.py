@@ -0,0 +1,132 @@
+from datetime import datetime
+from sqlalchemy import insert, event
+from sqlalchemy.orm import Session
+from app.models import db, User, Notification, NotificationPreference
+from app.utils.email import send_email
+from app.utils.notifications import bump_unread_counters, queue_publish
+from app.utils.realtime import socketio, user_room
+
+_PUSH_KEY = 'notification_pushes'
+
+# Users loaded (with their preferences) and inserted per round trip
+DISPATCH_CHUNK_SIZE = 500
+DEFAULT_CHANNELS = ('in_app', 'email', 'push')
+
+
+class InAppChannel:
+    """Notification center rows, bulk-inserted with RETURNING"""
+    preference = None
+
+    def deliver(self, recipients, notification):
+        now = datetime.utcnow()
+        rows = [dict(notification['fields'], user_id=user.id, is_read=False, created_at=now)
+                for user, _ in recipients]
+        inserted = db.session.execute(
+            insert(Notification).returning(Notification.id, Notification.user_id), rows
+        ).all()
+
+        # Bulk inserts skip the after_insert hook, so bump counters here
+        unread = bump_unread_counters(db.session.connection(), {user_id: 1 for _, user_id in inserted})
+        for notification_id, user_id in inserted:
+            notification['ids'][user_id] = notification_id
+            queue_publish(db.session, user_id, dict(
+                notification['fields'], id=notification_id, is_read=False,
+                created_at=now.isoformat(), unread_count=unread.get(user_id)
+            ))
+
+
+class EmailChannel:
+    """One outbox email per recipient, through the rate limiter/coalescer"""
+    preference = 'email_notifications'
+
+    def deliver(self, recipients, notification):
+        email = notification.get('email')
+        if not email:
+            return
+        template, subject, context = email
+        for user, _ in recipients:
+            send_email(user.email, subject, template, commit=False, **dict(context, user=user))
+
+
+class PushChannel:
+    """Socket.IO 'notification' event to each user's room, after commit"""
+    preference = 'push_notifications'
+
+    def deliver(self, recipients, notification):
+        pushes = db.session.info.setdefault(_PUSH_KEY, [])
+        for user, _ in recipients:
+            pushes.append((user.id, dict(notification['fields'], id=notification['ids'].get(user.id))))
+
+
+channels = {
+    'in_app': InAppChannel(),
+    'email': EmailChannel(),
+    'push': PushChannel(),
+}
+
+
+def register_channel(name, channel):
+    """Add a delivery channel: an object with `preference` and `deliver(recipients, notification)`"""
+    channels[name] = channel
+
+
+def _enabled(channel, preference):
+    if channel.preference is None or preference is None:
+        return True
+    return getattr(preference, channel.preference) is not False
+
+
+def _recipients(users):
+    """(user, preference) pairs in chunks, loading users given as ids"""
+    ids = [user if isinstance(user, int) else user.id for user in users]
+    for start in range(0, len(ids), DISPATCH_CHUNK_SIZE):
+        chunk = ids[start:start + DISPATCH_CHUNK_SIZE]
+        yield db.session.query(User, NotificationPreference).outerjoin(
+            NotificationPreference, NotificationPreference.user_id == User.id
+        ).filter(User.id.in_(chunk)).order_by(User.id).all()
+
+
+def notify(users, title, message, notification_type, channel_names=DEFAULT_CHANNELS, email=None, **related):
+    """Fan one notification out to users over the requested channels.
+
+    `users` are User objects or ids; `email` is (template, subject,
+    context) for the email channel, rendered per user with `user` added to
+    the context; `related` takes related_booking_id / related_payment_id /
+    related_message_id. Channels a user has switched off in their
+    preferences are skipped. Nothing is committed: socket pushes and
+    notification streams go out when the caller commits. Returns the
+    number of recipients.
+    """
+    fields = {
+        'title': title,
+        'message': message,
+        'notification_type': notification_type,
+        'related_booking_id': related.get('related_booking_id'),
+        'related_payment_id': related.get('related_payment_id'),
+        'related_message_id': related.get('related_message_id'),
+    }
+    count = 0
+    for recipients in _recipients(users):
+        notification = {'fields': fields, 'email': email, 'ids': {}}
+        for name in channel_names:
+            channel = channels[name]
+            enabled = [(user, preference) for user, preference in recipients if _enabled(channel, preference)]
+            if enabled:
+                channel.deliver(enabled, notification)
+        count += len(recipients)
+    return count
+
+
+@event.listens_for(Session, 'after_commit')
+def _push_committed_notifications(session):
+    for user_id, payload in session.info.pop(_PUSH_KEY, []):
+        try:
+            socketio.emit('notification', payload, to=user_room(user_id))
+        except Exception as e:
+            print(f"Error pushing notification: {str(e)}")
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_rolled_back_pushes(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(_PUSH_KEY, None)
@@ -0,0 +1,196 @@
+from datetime import datetime
+from sqlalchemy import event, select, func
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models import db, Notification, NotificationCounter
+from app.utils.realtime import event_bus
+
+_PENDING_KEY = 'notifications_to_publish'
+
+notifications_table = Notification.__table__
+counters_table = NotificationCounter.__table__
+
+
+def notification_channel(user_id):
+    return f'notifications:{user_id}'
+
+
+def notification_dict(notification):
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'notification_type': notification.notification_type,
+        'related_booking_id': notification.related_booking_id,
+        'related_payment_id': notification.related_payment_id,
+        'related_message_id': notification.related_message_id,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat() if notification.created_at else None
+    }
+
+
+def _insert_ignore(connection, values):
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        stmt = pg_insert(counters_table).values(**values).on_conflict_do_nothing()
+    elif dialect == 'sqlite':
+        stmt = sqlite_insert(counters_table).values(**values).on_conflict_do_nothing()
+    else:
+        stmt = counters_table.insert().values(**values).prefix_with('IGNORE')
+    return connection.execute(stmt).rowcount
+
+
+def adjust_unread_counter(connection, user_id, delta):
+    """Apply `delta` to the user's cached unread count; returns the new value.
+
+    Runs on the caller's connection so it commits with the change that
+    caused it. A user without a counter row yet is seeded from one COUNT
+    of their (already updated) notifications, the only time one is needed.
+    """
+    update = counters_table.update().where(
+        counters_table.c.user_id == user_id
+    ).values(unread_count=counters_table.c.unread_count + delta, updated_at=datetime.utcnow())
+
+    if not connection.execute(update).rowcount:
+        seed = connection.execute(
+            select(func.count()).select_from(notifications_table).where(
+                notifications_table.c.user_id == user_id,
+                notifications_table.c.is_read.is_(False)
+            )
+        ).scalar()
+        if not _insert_ignore(connection, {'user_id': user_id, 'unread_count': seed,
+                                           'updated_at': datetime.utcnow()}):
+            # Seeded concurrently by another transaction
+            connection.execute(update)
+
+    return connection.execute(
+        select(counters_table.c.unread_count).where(counters_table.c.user_id == user_id)
+    ).scalar()
+
+
+def bump_unread_counters(connection, deltas):
+    """Set-based adjust_unread_counter for many users at once.
+
+    `deltas` maps user_id -> change. Existing counters are updated with one
+    UPDATE per distinct delta; missing ones are seeded from a single
+    grouped COUNT. Returns {user_id: new unread count}.
+    """
+    if not deltas:
+        return {}
+    user_ids = list(deltas)
+    now = datetime.utcnow()
+    existing = set(connection.execute(
+        select(counters_table.c.user_id).where(counters_table.c.user_id.in_(user_ids))
+    ).scalars())
+
+    by_delta = {}
+    for user_id in existing:
+        by_delta.setdefault(deltas[user_id], []).append(user_id)
+    for delta, ids in by_delta.items():
+        connection.execute(counters_table.update().where(counters_table.c.user_id.in_(ids)).values(
+            unread_count=counters_table.c.unread_count + delta, updated_at=now))
+
+    missing = [user_id for user_id in user_ids if user_id not in existing]
+    if missing:
+        seeds = dict(connection.execute(
+            select(notifications_table.c.user_id, func.count()).where(
+                notifications_table.c.user_id.in_(missing),
+                notifications_table.c.is_read.is_(False)
+            ).group_by(notifications_table.c.user_id)
+        ).all())
+        for user_id in missing:
+            if not _insert_ignore(connection, {'user_id': user_id, 'unread_count': seeds.get(user_id, 0),
+                                               'updated_at': now}):
+                adjust_unread_counter(connection, user_id, deltas[user_id])
+
+    return dict(connection.execute(
+        select(counters_table.c.user_id, counters_table.c.unread_count).where(
+            counters_table.c.user_id.in_(user_ids))
+    ).all())
+
+
+def queue_publish(session, user_id, payload):
+    """Publish a notification payload to the user's streams once `session` commits"""
+    session.info.setdefault(_PENDING_KEY, []).append((user_id, payload))
+
+
+def reset_unread_counter(connection, user_id):
+    values = {'unread_count': 0, 'updated_at': datetime.utcnow()}
+    update = counters_table.update().where(counters_table.c.user_id == user_id).values(**values)
+    if not connection.execute(update).rowcount:
+        if not _insert_ignore(connection, dict(values, user_id=user_id)):
+            connection.execute(update)
+    return 0
+
+
+@event.listens_for(Notification, 'after_insert')
+def _notification_inserted(mapper, connection, target):
+    # Every ORM insert goes through here; bulk inserts use bump_unread_counters
+    unread_count = None
+    if not target.is_read:
+        unread_count = adjust_unread_counter(connection, target.user_id, 1)
+
+    session = object_session(target)
+    if session is not None:
+        queue_publish(session, target.user_id, dict(notification_dict(target), unread_count=unread_count))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed_notifications(session):
+    for user_id, payload in session.info.pop(_PENDING_KEY, []):
+        try:
+            event_bus.publish(notification_channel(user_id), {'event': 'notification', 'data': payload})
+        except Exception as e:
+            print(f"Error publishing notification: {str(e)}")
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_rolled_back_notifications(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+
+
+def unread_notification_count(user_id):
+    counter = NotificationCounter.query.get(user_id)
+    if counter is not None:
+        return counter.unread_count
+    return adjust_unread_counter(db.session.connection(), user_id, 0)
+
+
+def mark_notifications_read(user_id, notification_ids=None):
+    """Mark some (or all) of a user's notifications read in one UPDATE.
+
+    Returns (marked, unread_count); the caller commits.
+    """
+    query = Notification.query.filter_by(user_id=user_id, is_read=False)
+    if notification_ids is not None:
+        query = query.filter(Notification.id.in_(notification_ids))
+    marked = query.update({'is_read': True}, synchronize_session=False)
+
+    connection = db.session.connection()
+    if notification_ids is None:
+        # Nothing is left unread, whatever the counter had drifted to
+        unread_count = reset_unread_counter(connection, user_id)
+    elif marked:
+        unread_count = adjust_unread_counter(connection, user_id, -marked)
+    else:
+        unread_count = unread_notification_count(user_id)
+    return marked, unread_count
+
+
+def publish_unread_count(user_id, unread_count):
+    """Tell the user's open streams (other tabs included) the new count"""
+    event_bus.publish(notification_channel(user_id),
+                      {'event': 'unread', 'data': {'unread_count': unread_count}})
+
+
+def notifications_page(user_id, before=None, limit=20, unread_only=False):
+    """Newest-first page of notifications below the `before` id cursor"""
+    query = Notification.query.filter(Notification.user_id == user_id)
+    if unread_only:
+        query = query.filter(Notification.is_read.is_(False))
+    if before is not None:
+        query = query.filter(Notification.id < before)
+    rows = query.order_by(Notification.id.desc()).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
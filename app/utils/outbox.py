@@ -0,0 +1,290 @@
+import os
+import random
+import smtplib
+import socket
+import threading
+from datetime import datetime, timedelta
+from flask_mail import Message as MailMessage
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import db, EmailOutbox
+from app.utils.throttle import email_limiter
+
+EMAIL_WORKERS = 2
+EMAIL_BATCH_SIZE = 50
+EMAIL_POLL_SECONDS = 5
+EMAIL_MAX_ATTEMPTS = 6
+EMAIL_BACKOFF_BASE_SECONDS = 30
+EMAIL_BACKOFF_MAX_SECONDS = 3600
+# A 'sending' claim older than this belongs to a worker that died
+EMAIL_CLAIM_TIMEOUT = timedelta(minutes=10)
+_NOTIFY_KEY = 'outbox_notify'
+
+# Same-category emails to one recipient within this window merge into one
+EMAIL_COALESCE_WINDOW = timedelta(minutes=5)
+# A held email absorbs at most this many parts; further ones start a new
+# held email for the same window
+EMAIL_COALESCE_MAX_PARTS = 20
+_PART_SEPARATOR = '<hr style="border: none; border-top: 1px solid #dee2e6; margin: 30px 0;">'
+
+# Errors that mean the SMTP connection itself is unusable
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, socket.error)
+
+
+def enqueue_email(recipients, subject, html=None, body=None, sender=None, category=None):
+    """Add an email to the outbox in the current session (the caller commits)"""
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    entry = EmailOutbox(
+        recipients=','.join(recipients),
+        sender=sender,
+        subject=subject,
+        html=html,
+        body=body,
+        category=category,
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(entry)
+    return entry
+
+
+def backoff_delay(attempts):
+    """Exponential backoff with jitter, capped"""
+    delay = min(EMAIL_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), EMAIL_BACKOFF_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def _held_email(recipients, category):
+    """The pending, unclaimed email still absorbing this category, if any"""
+    return EmailOutbox.query.filter(
+        EmailOutbox.recipients == recipients,
+        EmailOutbox.category == category,
+        EmailOutbox.status == 'pending',
+        EmailOutbox.locked_by.is_(None),
+        EmailOutbox.attempts == 0
+    ).order_by(EmailOutbox.id.desc()).first()
+
+
+def _merge_into(held, html, body):
+    # Conditional, so an email a worker has just claimed is left alone
+    return EmailOutbox.query.filter(
+        EmailOutbox.id == held.id,
+        EmailOutbox.status == 'pending',
+        EmailOutbox.locked_by.is_(None)
+    ).update({
+        'html': db.func.coalesce(EmailOutbox.html, '') + _PART_SEPARATOR + (html or ''),
+        'body': db.func.coalesce(EmailOutbox.body, '') + '\n\n----\n\n' + (body or ''),
+        'parts': EmailOutbox.parts + 1
+    }, synchronize_session=False) == 1
+
+
+def queue_email(recipients, subject, html=None, body=None, sender=None, category=None):
+    """Enqueue an email through the per-recipient rate limiter and coalescer.
+
+    The first email of a category goes out immediately (while the
+    recipient's token bucket allows). Further ones of that category inside
+    EMAIL_COALESCE_WINDOW are held and merged into a single email sent when
+    the window closes; once that email holds EMAIL_COALESCE_MAX_PARTS, the
+    next part starts another held email, so nothing is dropped. Returns
+    'sent', 'held' or 'coalesced'.
+    """
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    key = ','.join(recipients)
+    now = datetime.utcnow()
+    outcome = None
+
+    if category:
+        held = _held_email(key, category)
+        if (held is not None and held.next_attempt_at > now and held.parts < EMAIL_COALESCE_MAX_PARTS
+                and _merge_into(held, html, body)):
+            outcome = 'coalesced'
+
+    if outcome is None:
+        last_sent = None
+        if category:
+            last_sent = db.session.query(db.func.max(EmailOutbox.created_at)).filter(
+                EmailOutbox.recipients == key,
+                EmailOutbox.category == category,
+                EmailOutbox.created_at >= now - EMAIL_COALESCE_WINDOW
+            ).scalar()
+        entry = enqueue_email(recipients, subject, html=html, body=body, sender=sender, category=category)
+        if last_sent is not None:
+            entry.next_attempt_at = last_sent + EMAIL_COALESCE_WINDOW
+            outcome = 'held'
+        elif not email_limiter.allow(key):
+            entry.next_attempt_at = now + EMAIL_COALESCE_WINDOW
+            outcome = 'held'
+        else:
+            outcome = 'sent'
+
+    email_limiter.record(outcome)
+    db.session.info[_NOTIFY_KEY] = True
+    return outcome
+
+
+def _mail_message(entry, default_sender):
+    subject = entry.subject
+    if (entry.parts or 1) > 1:
+        subject = f'{subject} (+{entry.parts - 1} more)'
+    return MailMessage(
+        subject=subject,
+        recipients=[address for address in entry.recipients.split(',') if address],
+        html=entry.html,
+        body=entry.body,
+        sender=entry.sender or default_sender
+    )
+
+
+class OutboxWorkerPool:
+    """A fixed number of threads draining the email outbox.
+
+    Workers claim batches with a conditional UPDATE, so any number of
+    processes can share one outbox, and send each batch over a single SMTP
+    connection that stays open while work keeps arriving.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.mail = None
+        self.workers = []
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, mail):
+        self.app = app
+        self.mail = mail
+        if app.config.get('EMAIL_WORKERS', EMAIL_WORKERS) > 0:
+            self.start()
+
+    def start(self):
+        with self._lock:
+            if self.workers:
+                return
+            for index in range(self.app.config.get('EMAIL_WORKERS', EMAIL_WORKERS)):
+                worker_id = f'{socket.gethostname()}:{os.getpid()}:{index}'
+                thread = threading.Thread(target=self._run, args=(worker_id,), daemon=True,
+                                          name=f'email-outbox-{index}')
+                thread.start()
+                self.workers.append(thread)
+
+    def notify(self):
+        """Wake idle workers (call after committing new outbox rows)"""
+        self._wakeup.set()
+
+    def _run(self, worker_id):
+        poll_seconds = self.app.config.get('EMAIL_POLL_SECONDS', EMAIL_POLL_SECONDS)
+        while True:
+            try:
+                with self.app.app_context():
+                    try:
+                        self.drain(worker_id)
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                print(f"Error in email outbox worker {worker_id}: {str(e)}")
+            self._wakeup.wait(poll_seconds)
+            self._wakeup.clear()
+
+    def claim(self, worker_id, batch_size=EMAIL_BATCH_SIZE):
+        """Atomically take up to `batch_size` due emails for this worker"""
+        now = datetime.utcnow()
+        due = db.or_(
+            db.and_(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now),
+            db.and_(EmailOutbox.status == 'sending', EmailOutbox.locked_at < now - EMAIL_CLAIM_TIMEOUT)
+        )
+        candidate_ids = [row[0] for row in db.session.query(EmailOutbox.id).filter(due)
+                         .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id).limit(batch_size)]
+        if not candidate_ids:
+            return []
+
+        EmailOutbox.query.filter(EmailOutbox.id.in_(candidate_ids), due).update(
+            {'status': 'sending', 'locked_by': worker_id, 'locked_at': now}, synchronize_session=False)
+        db.session.commit()
+        # Rows another worker claimed first simply aren't ours
+        return EmailOutbox.query.filter(
+            EmailOutbox.id.in_(candidate_ids),
+            EmailOutbox.status == 'sending',
+            EmailOutbox.locked_by == worker_id,
+            EmailOutbox.locked_at == now
+        ).order_by(EmailOutbox.id).all()
+
+    def drain(self, worker_id='inline', batch_size=EMAIL_BATCH_SIZE):
+        """Send due emails until none are left; returns how many were sent"""
+        default_sender = self.app.config.get('MAIL_DEFAULT_SENDER')
+        max_attempts = self.app.config.get('EMAIL_MAX_ATTEMPTS', EMAIL_MAX_ATTEMPTS)
+        sent = 0
+        batch = self.claim(worker_id, batch_size)
+        while batch:
+            connection = None
+            try:
+                for entry in batch:
+                    try:
+                        if connection is None:
+                            connection = self.mail.connect().__enter__()
+                        connection.send(_mail_message(entry, default_sender))
+                        entry.status = 'sent'
+                        entry.sent_at = datetime.utcnow()
+                        entry.locked_by = None
+                        sent += 1
+                    except Exception as e:
+                        self._failed(entry, e, max_attempts)
+                        if isinstance(e, _CONNECTION_ERRORS):
+                            # Reconnect for the rest of the batch
+                            connection = None
+                    db.session.commit()
+            finally:
+                if connection is not None:
+                    try:
+                        connection.__exit__(None, None, None)
+                    except Exception:
+                        pass
+            batch = self.claim(worker_id, batch_size)
+        return sent
+
+    def _failed(self, entry, error, max_attempts):
+        entry.attempts = (entry.attempts or 0) + 1
+        entry.last_error = str(error)[:1000]
+        entry.locked_by = None
+        if entry.attempts >= max_attempts:
+            entry.status = 'failed'
+        else:
+            entry.status = 'pending'
+            entry.next_attempt_at = datetime.utcnow() + backoff_delay(entry.attempts)
+        print(f"Error sending email {entry.id} (attempt {entry.attempts}): {str(error)}")
+
+
+def queue_depth():
+    """Outbox size by status, plus how many pending emails are already due"""
+    counts = dict(db.session.query(EmailOutbox.status, db.func.count(EmailOutbox.id))
+                  .filter(EmailOutbox.status != 'sent').group_by(EmailOutbox.status).all())
+    due = db.session.query(db.func.count(EmailOutbox.id)).filter(
+        EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= datetime.utcnow()
+    ).scalar()
+    oldest = db.session.query(db.func.min(EmailOutbox.created_at)).filter(
+        EmailOutbox.status == 'pending').scalar()
+    return {
+        'pending': counts.get('pending', 0),
+        'due': due,
+        'sending': counts.get('sending', 0),
+        'failed': counts.get('failed', 0),
+        'oldest_pending_at': oldest.isoformat() if oldest else None
+    }
+
+
+outbox = OutboxWorkerPool()
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_workers(session):
+    # Queued rows are only visible to the workers once committed
+    if session.info.pop(_NOTIFY_KEY, False):
+        outbox.notify()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_wakeup(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(_NOTIFY_KEY, None)
@@ -0,0 +1,204 @@
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import insert, update, select, case, exists, and_, or_, func
+from sqlalchemy.orm import joinedload
+from app.models import db, PaymentSchedule, PaymentInstallment, Invoice, Payment
+from app.utils.forecast import installment_dates, installment_amounts
+from app.utils.invoice_pdfs import queue_created_invoice_pdfs
+
+SCHEDULE_BATCH_SIZE = 200
+# Installments generated per schedule in one run when the job has fallen behind
+MAX_CATCH_UP_INSTALLMENTS = 60
+# Days an installment may stay unpaid before its schedule counts as overdue
+OVERDUE_GRACE_DAYS = 3
+
+
+def _anchor(schedule):
+    return schedule.first_payment_date or schedule.next_payment_date
+
+
+def _to_dates(days):
+    """datetime64[D] values -> date objects"""
+    return [d.astype(datetime) for d in days]
+
+
+def upcoming_installments(schedule, count=6):
+    """The next `count` installments of a schedule, computed without storing them"""
+    sequences = np.arange(schedule.installment_count, schedule.installment_count + count)
+    dates = installment_dates([_anchor(schedule)] * count, sequences, [schedule.payment_frequency] * count)
+    amount = installment_amounts([schedule.total_amount], [_anchor(schedule)], [schedule.end_date],
+                                 [schedule.payment_frequency])[0]
+    return [
+        {'sequence': int(sequence), 'due_date': datetime.combine(due_date, datetime.min.time()), 'amount': round(float(amount), 2)}
+        for sequence, due_date in zip(sequences, _to_dates(dates))
+        if schedule.end_date is None or due_date <= schedule.end_date.date()
+    ]
+
+
+def _due_installments(schedules, now):
+    """For each schedule: (due dates up to `now`, next date after them).
+
+    Dates for the whole batch are computed in one vectorized call over a
+    (schedules x MAX_CATCH_UP_INSTALLMENTS) grid of sequence numbers.
+    """
+    anchors = [_anchor(s) for s in schedules]
+    frequencies = [s.payment_frequency for s in schedules]
+    counts = np.array([s.installment_count for s in schedules])
+    offsets = np.arange(MAX_CATCH_UP_INSTALLMENTS)
+
+    sequences = counts[:, None] + offsets[None, :]
+    dates = installment_dates(
+        np.repeat(anchors, MAX_CATCH_UP_INSTALLMENTS).astype('datetime64[D]'),
+        sequences.ravel(),
+        np.repeat(frequencies, MAX_CATCH_UP_INSTALLMENTS)
+    ).reshape(sequences.shape)
+
+    last_day = np.array([np.datetime64(now, 'D') if s.end_date is None else min(np.datetime64(now, 'D'), np.datetime64(s.end_date, 'D'))
+                         for s in schedules])
+    due_counts = (dates <= last_day[:, None]).sum(axis=1)
+    next_dates = installment_dates(anchors, counts + due_counts, frequencies)
+
+    return [
+        (_to_dates(row[:n]), next_date.astype(datetime))
+        for row, n, next_date in zip(dates, due_counts, next_dates)
+    ]
+
+
+def _claim(schedule, due_count, next_date):
+    # Conditional UPDATE on installment_count: a concurrent run can't bill the same installments
+    return PaymentSchedule.query.filter(
+        PaymentSchedule.id == schedule.id,
+        PaymentSchedule.installment_count == schedule.installment_count
+    ).update({
+        'installment_count': schedule.installment_count + due_count,
+        'first_payment_date': _anchor(schedule),
+        'next_payment_date': datetime.combine(next_date, datetime.min.time()),
+    }, synchronize_session=False) == 1
+
+
+def generate_due_installments(now=None, batch_size=SCHEDULE_BATCH_SIZE):
+    """Bill every installment of an active schedule that has fallen due.
+
+    Schedules are read in keyset batches from the (is_active,
+    next_payment_date) index. Per batch, due dates and amounts are
+    computed with the vectorized forecast helpers, each schedule's
+    installments are claimed by a conditional UPDATE, and the invoices
+    and installment rows are bulk-inserted in the same transaction.
+    Returns the number of installments created.
+    """
+    now = now or datetime.utcnow()
+    created_ids = []
+    after_id = 0
+
+    while True:
+        schedules = PaymentSchedule.query.options(joinedload(PaymentSchedule.booking)).filter(
+            PaymentSchedule.is_active.is_(True),
+            PaymentSchedule.next_payment_date <= now,
+            or_(PaymentSchedule.end_date.is_(None), PaymentSchedule.next_payment_date <= PaymentSchedule.end_date),
+            PaymentSchedule.id > after_id
+        ).order_by(PaymentSchedule.id).limit(batch_size).all()
+        if not schedules:
+            break
+        after_id = schedules[-1].id
+
+        # Bounded schedules split total_amount over the installments billed from the anchor
+        amounts = installment_amounts(
+            [s.total_amount for s in schedules], [_anchor(s) for s in schedules],
+            [s.end_date for s in schedules], [s.payment_frequency for s in schedules]
+        )
+
+        invoice_rows, installment_rows = [], []
+        for schedule, amount, (due_dates, next_date) in zip(schedules, amounts, _due_installments(schedules, now)):
+            if not due_dates or not _claim(schedule, len(due_dates), next_date):
+                continue
+            amount = round(float(amount), 2)
+            for offset, due_date in enumerate(due_dates):
+                sequence = schedule.installment_count + offset
+                due_at = datetime.combine(due_date, datetime.min.time())
+                invoice_rows.append({
+                    'user_id': schedule.user_id,
+                    'property_id': schedule.booking.property_id if schedule.booking else None,
+                    'invoice_number': f"SCH-{schedule.id}-{sequence + 1:04d}",
+                    'description': f"Installment {sequence + 1} for booking #{schedule.booking_id}",
+                    'amount': amount,
+                    'invoice_type': 'rent',
+                    'issue_date': now,
+                    'due_date': due_at,
+                    'status': 'sent',
+                })
+                installment_rows.append({
+                    'schedule_id': schedule.id,
+                    'sequence': sequence,
+                    'due_date': due_at,
+                    'amount': amount,
+                    'status': 'invoiced',
+                })
+
+        if invoice_rows:
+            invoice_ids = db.session.execute(
+                insert(Invoice).returning(Invoice.id, sort_by_parameter_order=True), invoice_rows
+            ).scalars().all()
+            for row, invoice_id in zip(installment_rows, invoice_ids):
+                row['invoice_id'] = invoice_id
+            db.session.execute(insert(PaymentInstallment), installment_rows)
+            created_ids.extend(invoice_ids)
+        db.session.commit()
+
+    queue_created_invoice_pdfs(created_ids)
+    return len(created_ids)
+
+
+def refresh_schedule_statuses(now=None, grace_days=OVERDUE_GRACE_DAYS):
+    """Bring installment and schedule statuses up to date in one sweep.
+
+    Installments whose invoice has been paid are marked paid and linked to
+    the completed payment. Then a single UPDATE sets every active
+    schedule to 'overdue' (an installment unpaid past the grace period),
+    'completed' (past its end date with nothing left unpaid, which also
+    deactivates it) or 'active'. Only rows whose status changes are
+    written. Returns the number of installments and schedules updated.
+    """
+    now = now or datetime.utcnow()
+
+    invoice_paid_date = select(Invoice.paid_date).where(
+        Invoice.id == PaymentInstallment.invoice_id
+    ).scalar_subquery()
+    completed_payment = select(Payment.id).where(
+        Payment.invoice_id == PaymentInstallment.invoice_id,
+        Payment.status == 'completed'
+    ).order_by(Payment.id).limit(1).scalar_subquery()
+    paid = db.session.execute(
+        update(PaymentInstallment).where(
+            PaymentInstallment.status != 'paid',
+            PaymentInstallment.invoice_id.in_(select(Invoice.id).where(Invoice.status == 'paid'))
+        ).values(status='paid', paid_at=func.coalesce(invoice_paid_date, now), payment_id=completed_payment),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+
+    unpaid = and_(PaymentInstallment.schedule_id == PaymentSchedule.id, PaymentInstallment.status != 'paid')
+    overdue = exists().where(unpaid, PaymentInstallment.due_date < now - timedelta(days=grace_days))
+    finished = and_(
+        PaymentSchedule.end_date.isnot(None),
+        PaymentSchedule.next_payment_date > PaymentSchedule.end_date,
+        ~exists().where(unpaid)
+    )
+    new_status = case((overdue, 'overdue'), (finished, 'completed'), else_='active')
+
+    schedules = db.session.execute(
+        update(PaymentSchedule).where(
+            PaymentSchedule.is_active.is_(True),
+            PaymentSchedule.status.is_distinct_from(new_status)
+        ).values(status=new_status, is_active=~finished),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    db.session.commit()
+    return {'installments_paid': paid, 'schedules_updated': schedules}
+
+
+def process_payment_schedules(now=None):
+    """Scheduled job: bill due installments, then refresh statuses"""
+    now = now or datetime.utcnow()
+    created = generate_due_installments(now)
+    stats = refresh_schedule_statuses(now)
+    stats['installments_created'] = created
+    return stats
@@ -0,0 +1,253 @@
+import time
+from threading import Lock
+from app.models import db, Conversation
+from app.utils.realtime import socketio, user_room
+
+# Every worker refreshes the connections it still holds this often (clients
+# may also send a 'heartbeat' event); a connection not refreshed within the
+# TTL is treated as gone (worker crashed, disconnect never delivered)
+PRESENCE_HEARTBEAT_SECONDS = 25
+PRESENCE_TTL_SECONDS = 60
+
+
+class LocalPresenceStore:
+    """Per-process presence, for single-node runs and tests"""
+
+    def __init__(self):
+        self._connections = {}  # user_id -> {sid: expires_at}
+        self._lock = Lock()
+
+    def add(self, user_id, sid, expires_at, now):
+        """Store a connection; returns True if the user just came online"""
+        with self._lock:
+            sids = self._connections.setdefault(user_id, {})
+            was_online = any(expiry > now for expiry in sids.values())
+            sids[sid] = expires_at
+            return not was_online
+
+    def touch(self, user_id, sid, expires_at):
+        with self._lock:
+            self._connections.setdefault(user_id, {})[sid] = expires_at
+
+    def touch_many(self, connections, expires_at):
+        """Refresh several (user_id, sid) connections at once"""
+        with self._lock:
+            for user_id, sid in connections:
+                self._connections.setdefault(user_id, {})[sid] = expires_at
+
+    def remove(self, user_id, sid, now):
+        """Drop a connection; returns True if it was the user's last one"""
+        with self._lock:
+            sids = self._connections.get(user_id, {})
+            sids.pop(sid, None)
+            if any(expiry > now for expiry in sids.values()):
+                return False
+            self._connections.pop(user_id, None)
+            return True
+
+    def online(self, user_ids, now):
+        with self._lock:
+            return {
+                user_id for user_id in user_ids
+                if any(expiry > now for expiry in self._connections.get(user_id, {}).values())
+            }
+
+    def sweep(self, now):
+        """Forget expired connections; returns users left with none"""
+        offline = []
+        with self._lock:
+            for user_id, sids in list(self._connections.items()):
+                for sid, expiry in list(sids.items()):
+                    if expiry <= now:
+                        del sids[sid]
+                if not sids:
+                    del self._connections[user_id]
+                    offline.append(user_id)
+        return offline
+
+
+class RedisPresenceStore:
+    """Presence shared by every worker and node through Redis.
+
+    Each user has a hash of sid -> expiry; a sorted set of "user:sid"
+    members scored by expiry lets any worker sweep connections whose
+    owner died without disconnecting.
+    """
+
+    SWEEP_KEY = 'presence:expiry'
+
+    def __init__(self, url):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+
+    def _key(self, user_id):
+        return f'presence:user:{user_id}'
+
+    def _live(self, expiries, now):
+        return any(float(expiry) > now for expiry in expiries)
+
+    def add(self, user_id, sid, expires_at, now):
+        pipe = self.redis.pipeline()
+        pipe.hvals(self._key(user_id))
+        pipe.hset(self._key(user_id), sid, expires_at)
+        pipe.zadd(self.SWEEP_KEY, {f'{user_id}:{sid}': expires_at})
+        existing = pipe.execute()[0]
+        return not self._live(existing, now)
+
+    def touch(self, user_id, sid, expires_at):
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key(user_id), sid, expires_at)
+        pipe.zadd(self.SWEEP_KEY, {f'{user_id}:{sid}': expires_at})
+        pipe.execute()
+
+    def touch_many(self, connections, expires_at):
+        pipe = self.redis.pipeline()
+        for user_id, sid in connections:
+            pipe.hset(self._key(user_id), sid, expires_at)
+            pipe.zadd(self.SWEEP_KEY, {f'{user_id}:{sid}': expires_at})
+        pipe.execute()
+
+    def remove(self, user_id, sid, now):
+        pipe = self.redis.pipeline()
+        pipe.hdel(self._key(user_id), sid)
+        pipe.zrem(self.SWEEP_KEY, f'{user_id}:{sid}')
+        pipe.hvals(self._key(user_id))
+        remaining = pipe.execute()[2]
+        return not self._live(remaining, now)
+
+    def online(self, user_ids, now):
+        user_ids = list(user_ids)
+        pipe = self.redis.pipeline()
+        for user_id in user_ids:
+            pipe.hvals(self._key(user_id))
+        return {
+            user_id for user_id, expiries in zip(user_ids, pipe.execute())
+            if self._live(expiries, now)
+        }
+
+    def sweep(self, now):
+        offline = set()
+        for member in self.redis.zrangebyscore(self.SWEEP_KEY, 0, now):
+            # Only the worker whose ZREM succeeds reports the connection gone
+            if not self.redis.zrem(self.SWEEP_KEY, member):
+                continue
+            user_id, sid = member.decode().split(':', 1)
+            user_id = int(user_id)
+            expiry = self.redis.hget(self._key(user_id), sid)
+            if expiry is not None and float(expiry) <= now:
+                self.redis.hdel(self._key(user_id), sid)
+            if not self._live(self.redis.hvals(self._key(user_id)), now):
+                offline.add(user_id)
+        return list(offline)
+
+
+def conversation_partner_ids(user_id):
+    """Ids of everyone the user has a conversation with"""
+    rows = db.session.query(
+        db.case((Conversation.user_low_id == user_id, Conversation.user_high_id),
+                else_=Conversation.user_low_id)
+    ).filter(
+        db.or_(Conversation.user_low_id == user_id, Conversation.user_high_id == user_id)
+    )
+    return [row[0] for row in rows]
+
+
+class PresenceService:
+    """Tracks every live connection of every user, with heartbeat expiry.
+
+    Presence changes are only pushed to the user's conversation partners,
+    and only on real transitions: a second tab or a reconnect doesn't
+    re-announce the user, and closing one of two tabs keeps them online.
+
+    Each worker keeps the TTL of the connections it holds fresh itself
+    (Engine.IO's ping/pong already disconnects dead clients), so clients
+    don't have to send heartbeats; only connections whose worker died
+    expire.
+    """
+
+    def __init__(self):
+        self.store = LocalPresenceStore()
+        self.ttl = PRESENCE_TTL_SECONDS
+        self.app = None
+        self._local = {}  # sid -> user_id, connections held by this worker
+        self._local_lock = Lock()
+        self._sweeper_started = False
+        self._sweeper_lock = Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.ttl = app.config.get('PRESENCE_TTL_SECONDS', PRESENCE_TTL_SECONDS)
+        url = app.config.get('PRESENCE_REDIS_URL')
+        self.store = RedisPresenceStore(url) if url else LocalPresenceStore()
+
+    def connect(self, user_id, sid):
+        """Register a connection; returns True if the user just came online"""
+        now = time.time()
+        with self._local_lock:
+            self._local[sid] = user_id
+        came_online = self.store.add(user_id, sid, now + self.ttl, now)
+        if came_online:
+            self.publish(user_id, True)
+        self._start_sweeper()
+        return came_online
+
+    def heartbeat(self, user_id, sid):
+        self.store.touch(user_id, sid, time.time() + self.ttl)
+
+    def disconnect(self, user_id, sid):
+        """Drop a connection; returns True if it was the user's last one"""
+        with self._local_lock:
+            self._local.pop(sid, None)
+        went_offline = self.store.remove(user_id, sid, time.time())
+        if went_offline:
+            self.publish(user_id, False)
+        return went_offline
+
+    def is_online(self, user_id):
+        return user_id in self.online(user_id)
+
+    def online(self, *user_ids):
+        """Bulk lookup: the subset of `user_ids` with a live connection"""
+        return self.store.online(user_ids, time.time())
+
+    def publish(self, user_id, online):
+        payload = {'user_id': user_id, 'online': online}
+        for partner_id in conversation_partner_ids(user_id):
+            socketio.emit('presence', payload, to=user_room(partner_id))
+
+    def refresh_local(self):
+        """Extend the TTL of every connection still open on this worker"""
+        with self._local_lock:
+            connections = [(user_id, sid) for sid, user_id in self._local.items()]
+        if connections:
+            self.store.touch_many(connections, time.time() + self.ttl)
+        return len(connections)
+
+    def sweep(self):
+        """Expire connections that are no longer refreshed; returns users now offline"""
+        offline = self.store.sweep(time.time())
+        for user_id in offline:
+            self.publish(user_id, False)
+        return offline
+
+    def _start_sweeper(self):
+        with self._sweeper_lock:
+            if self._sweeper_started or self.app is None:
+                return
+            self._sweeper_started = True
+        socketio.start_background_task(self._sweep_forever)
+
+    def _sweep_forever(self):
+        while True:
+            socketio.sleep(self.app.config.get('PRESENCE_HEARTBEAT_SECONDS', PRESENCE_HEARTBEAT_SECONDS))
+            with self.app.app_context():
+                try:
+                    self.refresh_local()
+                    self.sweep()
+                except Exception as e:
+                    print(f"Error sweeping presence: {str(e)}")
+                finally:
+                    db.session.remove()
+
+
+presence = PresenceService()
@@ -0,0 +1,280 @@
+import time
+import zlib
+from threading import Lock
+import numpy as np
+from app.models import db, Property
+
+PROPERTY_TYPES = ('apartment', 'house', 'room', 'studio', 'townhouse', 'cottage')
+AMENITY_BUCKETS = 16
+
+# Feature weights, chosen so that one unit of distance is roughly "one
+# bedroom different"
+BEDROOM_WEIGHT = 1.0
+BATHROOM_WEIGHT = 0.75
+TYPE_WEIGHT = 1.5
+AMENITY_WEIGHT = 0.35
+COORD_WEIGHT = 20.0  # per degree, ~0.05 deg (5km) == 1 unit
+
+DEFAULT_K = 8
+MIN_COMPARABLES = 3
+
+
+def _normalize(value):
+    return (value or '').strip().lower()
+
+
+def _amenity_bucket(amenity):
+    # crc32 is stable across processes, unlike hash()
+    return zlib.crc32(amenity.encode('utf-8')) % AMENITY_BUCKETS
+
+
+def feature_vector(property_type, bedrooms, bathrooms, amenities):
+    """Weighted, location-free feature vector for a listing"""
+    vector = np.zeros(3 + len(PROPERTY_TYPES) + AMENITY_BUCKETS, dtype=np.float32)
+    vector[0] = (bedrooms or 0) * BEDROOM_WEIGHT
+    vector[1] = (bathrooms or 0) * BATHROOM_WEIGHT
+
+    property_type = _normalize(property_type)
+    if property_type in PROPERTY_TYPES:
+        vector[2 + PROPERTY_TYPES.index(property_type)] = TYPE_WEIGHT
+    else:
+        vector[2 + len(PROPERTY_TYPES)] = TYPE_WEIGHT
+
+    offset = 3 + len(PROPERTY_TYPES)
+    for amenity in (amenities or '').split(','):
+        amenity = _normalize(amenity)
+        if amenity:
+            vector[offset + _amenity_bucket(amenity)] = AMENITY_WEIGHT
+    return vector
+
+
+def coordinates(latitude, longitude):
+    if latitude is None or longitude is None:
+        return np.zeros(2, dtype=np.float32), False
+    return np.array([latitude, longitude], dtype=np.float32) * COORD_WEIGHT, True
+
+
+class ComparableIndex:
+    """Dense NumPy arrays for one market (a city or a province).
+
+    Rows are updated in place and removed by swapping with the last row,
+    so keeping the index current costs O(changed rows) rather than a
+    full rebuild.
+    """
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.features = np.zeros((0, 3 + len(PROPERTY_TYPES) + AMENITY_BUCKETS), dtype=np.float32)
+        self.coords = np.zeros((0, 2), dtype=np.float32)
+        self.has_coords = np.zeros(0, dtype=bool)
+        self.prices = np.zeros(0, dtype=np.float64)
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def upsert(self, rows):
+        """Insert or update (id, features, coords, has_coords, price) rows"""
+        new_rows = []
+        for row in rows:
+            property_id, features, coords, has_coords, price = row
+            position = self.positions.get(property_id)
+            if position is None:
+                new_rows.append(row)
+                continue
+            self.features[position] = features
+            self.coords[position] = coords
+            self.has_coords[position] = has_coords
+            self.prices[position] = price
+
+        if new_rows:
+            start = len(self.ids)
+            ids, features, coords, has_coords, prices = zip(*new_rows)
+            self.ids = np.concatenate([self.ids, np.array(ids, dtype=np.int64)])
+            self.features = np.vstack([self.features, np.array(features, dtype=np.float32)])
+            self.coords = np.vstack([self.coords, np.array(coords, dtype=np.float32)])
+            self.has_coords = np.concatenate([self.has_coords, np.array(has_coords, dtype=bool)])
+            self.prices = np.concatenate([self.prices, np.array(prices, dtype=np.float64)])
+            for offset, property_id in enumerate(ids):
+                self.positions[property_id] = start + offset
+
+    def remove(self, property_id):
+        position = self.positions.pop(property_id, None)
+        if position is None:
+            return
+        last = len(self.ids) - 1
+        if position != last:
+            moved_id = int(self.ids[last])
+            for array in (self.ids, self.features, self.coords, self.has_coords, self.prices):
+                array[position] = array[last]
+            self.positions[moved_id] = position
+        self.ids = self.ids[:last]
+        self.features = self.features[:last]
+        self.coords = self.coords[:last]
+        self.has_coords = self.has_coords[:last]
+        self.prices = self.prices[:last]
+
+    def nearest(self, features, coords, has_coords, k, exclude_id=None):
+        """Return (ids, prices, distances) of the k closest listings"""
+        distances = np.sum((self.features - features) ** 2, axis=1)
+        if has_coords:
+            both = self.has_coords
+            distances[both] += np.sum((self.coords[both] - coords) ** 2, axis=1)
+        distances = np.sqrt(distances)
+
+        if exclude_id is not None and exclude_id in self.positions:
+            distances[self.positions[exclude_id]] = np.inf
+
+        k = min(k, int(np.isfinite(distances).sum()))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return self.ids[nearest], self.prices[nearest], distances[nearest]
+
+
+class PriceSuggestionService:
+    """Per-process registry of city and province comparable indexes.
+
+    The first lookup loads every listing once; afterwards only properties
+    whose `updated_at` moved past the high-water mark are re-read, at most
+    once every `refresh_interval` seconds. Deletions leave no `updated_at`
+    behind, so every `reconcile_interval` seconds the indexed ids are also
+    checked against the table; that drops listings deleted by other
+    processes.
+    """
+
+    def __init__(self, refresh_interval=30, reconcile_interval=300):
+        self.refresh_interval = refresh_interval
+        self.reconcile_interval = reconcile_interval
+        self._lock = Lock()
+        self._reset()
+
+    def _reset(self):
+        self.cities = {}
+        self.provinces = {}
+        self._markets = {}  # property_id -> (city_key, province_key)
+        self._high_water = None
+        self._last_refresh = 0
+        self._last_reconcile = 0
+
+    def invalidate(self):
+        """Drop all indexes so the next lookup rebuilds them from scratch"""
+        with self._lock:
+            self._reset()
+
+    def remove(self, property_id):
+        with self._lock:
+            self._remove(property_id)
+
+    def _remove(self, property_id):
+        markets = self._markets.pop(property_id, None)
+        if markets is None:
+            return
+        city_key, province_key = markets
+        self.cities[city_key].remove(property_id)
+        self.provinces[province_key].remove(property_id)
+
+    def _reconcile(self):
+        existing = {property_id for property_id, in db.session.query(Property.id)}
+        for property_id in set(self._markets) - existing:
+            self._remove(property_id)
+
+    def refresh(self, force=False):
+        """Fold properties changed since the last refresh into the indexes"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_refresh and now - self._last_refresh < self.refresh_interval:
+                return
+            self._last_refresh = now
+
+            query = db.session.query(
+                Property.id,
+                Property.city,
+                Property.province,
+                Property.property_type,
+                Property.bedrooms,
+                Property.bathrooms,
+                Property.amenities,
+                Property.latitude,
+                Property.longitude,
+                Property.price_per_month,
+                Property.updated_at,
+            )
+            if self._high_water is not None:
+                query = query.filter(Property.updated_at >= self._high_water)
+
+            changes = {}
+            for row in query:
+                (property_id, city, province, property_type, bedrooms, bathrooms,
+                 amenities, latitude, longitude, price, updated_at) = row
+                markets = (_normalize(city), _normalize(province))
+
+                # A property that moved market leaves its old indexes
+                if self._markets.get(property_id, markets) != markets:
+                    self._remove(property_id)
+                self._markets[property_id] = markets
+
+                coords, has_coords = coordinates(latitude, longitude)
+                entry = (property_id, feature_vector(property_type, bedrooms, bathrooms, amenities),
+                         coords, has_coords, price)
+                changes.setdefault(('city', markets[0]), []).append(entry)
+                changes.setdefault(('province', markets[1]), []).append(entry)
+
+                if updated_at and (self._high_water is None or updated_at > self._high_water):
+                    self._high_water = updated_at
+
+            for (level, key), rows in changes.items():
+                indexes = self.cities if level == 'city' else self.provinces
+                indexes.setdefault(key, ComparableIndex()).upsert(rows)
+
+            if force or now - self._last_reconcile >= self.reconcile_interval:
+                self._last_reconcile = now
+                self._reconcile()
+
+    def suggest(self, city, province, property_type, bedrooms, bathrooms,
+                amenities=None, latitude=None, longitude=None, k=DEFAULT_K, exclude_id=None):
+        """Suggest a monthly price range from the k nearest comparables.
+
+        Falls back to the whole province when the city has too few listings.
+        """
+        self.refresh()
+
+        features = feature_vector(property_type, bedrooms, bathrooms, amenities)
+        coords, has_coords = coordinates(latitude, longitude)
+
+        with self._lock:
+            market = 'city'
+            index = self.cities.get(_normalize(city))
+            if index is None or len(index) - (exclude_id in index.positions) < MIN_COMPARABLES:
+                market = 'province'
+                index = self.provinces.get(_normalize(province))
+            if index is None:
+                return None
+            ids, prices, distances = index.nearest(features, coords, has_coords, k, exclude_id)
+
+        if not len(ids):
+            return None
+
+        # Closer comparables count for more
+        weights = 1.0 / (distances + 0.5)
+        order = np.argsort(prices)
+        cumulative = np.cumsum(weights[order]) / weights.sum()
+
+        def weighted_percentile(q):
+            position = min(int(np.searchsorted(cumulative, q)), len(order) - 1)
+            return float(prices[order][position])
+
+        return {
+            'market': market,
+            'suggested': round(weighted_percentile(0.5), 2),
+            'low': round(weighted_percentile(0.25), 2),
+            'high': round(weighted_percentile(0.75), 2),
+            'comparables': [
+                {'property_id': int(i), 'price_per_month': float(p), 'distance': round(float(d), 3)}
+                for i, p, d in zip(ids, prices, distances)
+            ],
+        }
+
+
+price_suggestions = PriceSuggestionService()
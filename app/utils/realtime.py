@@ -0,0 +1,174 @@
+import json
+import pickle
+import queue
+from threading import Lock
+from urllib.parse import urlparse
+import socketio as socketio_lib
+from flask_socketio import SocketIO
+
+socketio = SocketIO()
+
+SOCKETIO_CHANNEL = 'flask-socketio'
+
+
+def user_room(user_id):
+    """Personal room every connection of a user joins on connect"""
+    return f"user_{user_id}"
+
+
+class LocalMessageQueue:
+    """In-process stand-in for a pub/sub broker.
+
+    Every subscriber of a channel gets its own copy of each message. Buses
+    are shared per name, so several client managers in one process (as in
+    tests simulating multiple nodes) see each other's messages exactly like
+    separate servers attached to Redis would.
+    """
+
+    _buses = {}
+    _buses_lock = Lock()
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = Lock()
+
+    @classmethod
+    def get(cls, name='default'):
+        with cls._buses_lock:
+            if name not in cls._buses:
+                cls._buses[name] = cls()
+            return cls._buses[name]
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            subscriber.put(message)
+        return len(subscribers)
+
+    def subscribe(self, channel):
+        subscriber = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, channel, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, [])
+            if subscriber in subscribers:
+                subscribers.remove(subscriber)
+
+    def listen(self, channel):
+        return LocalSubscription(self, channel)
+
+
+class LocalSubscription:
+    def __init__(self, bus, channel):
+        self.bus = bus
+        self.channel = channel
+        self._queue = bus.subscribe(channel)
+
+    def get(self, timeout=None):
+        """Next message, or None if nothing arrived within `timeout` seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self.channel, self._queue)
+
+
+class RedisMessageQueue:
+    """Same interface as LocalMessageQueue, over Redis pub/sub"""
+
+    def __init__(self, url):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        return self.redis.publish(channel, message)
+
+    def listen(self, channel):
+        return RedisSubscription(self.redis, channel)
+
+
+class RedisSubscription:
+    def __init__(self, client, channel):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(channel)
+
+    def get(self, timeout=None):
+        message = self.pubsub.get_message(timeout=timeout or 0)
+        return message['data'] if message else None
+
+    def close(self):
+        self.pubsub.close()
+
+
+class LocalPubSubManager(socketio_lib.PubSubManager):
+    """Socket.IO client manager backed by LocalMessageQueue (``local://name``)"""
+
+    name = 'local'
+
+    def __init__(self, url='local://', channel=SOCKETIO_CHANNEL, write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.bus = LocalMessageQueue.get(urlparse(url).netloc or 'default')
+
+    def _publish(self, data):
+        # Pickled like the Redis/Kombu managers, so no handler can mutate
+        # another server's copy
+        self.bus.publish(self.channel, pickle.dumps(data))
+
+    def _listen(self):
+        subscriber = self.bus.subscribe(self.channel)
+        try:
+            while True:
+                yield subscriber.get()
+        finally:
+            self.bus.unsubscribe(self.channel, subscriber)
+
+
+class EventBus:
+    """Pub/sub for app events consumed outside Socket.IO, such as SSE streams.
+
+    Uses Redis when SOCKETIO_MESSAGE_QUEUE points at it, so a stream served
+    by one worker sees events published by any other; otherwise events stay
+    in-process.
+    """
+
+    def __init__(self):
+        self.backend = LocalMessageQueue.get()
+
+    def init_app(self, app):
+        url = app.config.get('SOCKETIO_MESSAGE_QUEUE') or ''
+        if url.startswith(('redis://', 'rediss://')):
+            self.backend = RedisMessageQueue(url)
+        else:
+            self.backend = LocalMessageQueue.get(urlparse(url).netloc or 'default')
+
+    def publish(self, channel, payload):
+        self.backend.publish(channel, json.dumps(payload))
+
+    def listen(self, channel):
+        return self.backend.listen(channel)
+
+
+event_bus = EventBus()
+
+
+def socketio_options(message_queue):
+    """Flask-SocketIO init options for the configured message queue URL.
+
+    - no URL: plain in-memory manager, which is what Flask-SocketIO's test
+      client requires
+    - ``local://``: LocalPubSubManager, for single-node runs and for
+      exercising the pub/sub path without a broker
+    - anything else (redis://, amqp://, kafka://, zmq+tcp://) is handed to
+      Flask-SocketIO so events reach every worker and node
+    """
+    if not message_queue:
+        return {'client_manager': None}
+    if message_queue.startswith('local://'):
+        return {'client_manager': LocalPubSubManager(message_queue)}
+    return {'message_queue': message_queue, 'channel': SOCKETIO_CHANNEL}
@@ -0,0 +1,105 @@
+import calendar
+from datetime import datetime
+from sqlalchemy import insert
+from app.models import db, Invoice
+
+RECURRENCE_MONTHS = {
+    'monthly': 1,
+    'quarterly': 3,
+    'yearly': 12,
+}
+RECURRING_BATCH_SIZE = 200
+# Periods generated per invoice in one run when the job has fallen behind
+MAX_CATCH_UP_PERIODS = 24
+
+
+def add_months(value, months):
+    """Same day `months` later, clamped to the end of shorter months"""
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def next_occurrence(anchor, current, pattern):
+    """The due date after `current` in the series anchored at `anchor`.
+
+    Counting months from the anchor (rather than from `current`) keeps a
+    31st-of-the-month series on the 31st after passing through February.
+    """
+    elapsed = (current.year - anchor.year) * 12 + current.month - anchor.month
+    return add_months(anchor, elapsed + RECURRENCE_MONTHS[pattern])
+
+
+def _claim(template, expected, new_next):
+    # Conditional UPDATE: only one node can move next_due_date from `expected`
+    return Invoice.query.filter(
+        Invoice.id == template.id,
+        Invoice.next_due_date == expected
+    ).update({'next_due_date': new_next, 'updated_at': datetime.utcnow()}, synchronize_session=False) == 1
+
+
+def _occurrence_row(template, due_date, now):
+    return {
+        'user_id': template.user_id,
+        'property_id': template.property_id,
+        'invoice_number': f"{template.invoice_number}-{due_date.strftime('%Y%m%d')}",
+        'description': template.description,
+        'amount': template.amount,
+        'currency': template.currency,
+        'invoice_type': template.invoice_type,
+        'issue_date': now,
+        'due_date': due_date,
+        'status': 'sent',
+        'is_recurring': False,
+        'recurring_parent_id': template.id,
+        'created_at': now,
+        'updated_at': now,
+    }
+
+
+def materialize_recurring_invoices(now=None, batch_size=RECURRING_BATCH_SIZE):
+    """Create the invoices recurring invoices have fallen due for.
+
+    One indexed query per batch finds recurring invoices whose
+    next_due_date has passed. Each period is claimed by a conditional
+    UPDATE of next_due_date, so when several nodes run this at once every
+    period is generated exactly once; the claimed invoices of a batch are
+    then bulk-inserted in the same transaction. Returns the number created.
+    """
+    from app.utils.invoice_pdfs import queue_created_invoice_pdfs
+
+    now = now or datetime.utcnow()
+    created_ids = []
+    after_id = 0
+
+    while True:
+        templates = Invoice.query.filter(
+            Invoice.is_recurring.is_(True),
+            Invoice.next_due_date <= now,
+            Invoice.recurrence_pattern.in_(list(RECURRENCE_MONTHS)),
+            Invoice.id > after_id
+        ).order_by(Invoice.id).limit(batch_size).all()
+        if not templates:
+            break
+        after_id = templates[-1].id
+
+        rows = []
+        for template in templates:
+            due_date = template.next_due_date
+            for _ in range(MAX_CATCH_UP_PERIODS):
+                new_next = next_occurrence(template.due_date, due_date, template.recurrence_pattern)
+                if not _claim(template, due_date, new_next):
+                    break  # another node took this period
+                rows.append(_occurrence_row(template, due_date, now))
+                due_date = new_next
+                if due_date > now:
+                    break
+
+        if rows:
+            created_ids.extend(db.session.execute(insert(Invoice).returning(Invoice.id), rows).scalars())
+        db.session.commit()
+
+    queue_created_invoice_pdfs(created_ids)
+    return len(created_ids)
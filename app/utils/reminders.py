@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
+from app.models import db, Invoice, Lease, Booking, ReminderDispatch
+from app.utils.email import send_payment_reminder_email, send_rent_reminder_email, send_lease_expiration_alert
+
+# Remind tenants this many days before an invoice falls due
+INVOICE_REMINDER_DAYS = 3
+# Invoices still waiting on payment
+UNPAID_INVOICE_STATUSES = ('sent', 'viewed', 'partial')
+# Used when a lease has no renewal_notice_days of its own
+DEFAULT_LEASE_NOTICE_DAYS = 30
+REMINDER_BATCH_SIZE = 200
+
+
+def _not_dispatched(reminder_type, target_id, due_at):
+    return ~db.exists().where(
+        ReminderDispatch.reminder_type == reminder_type,
+        ReminderDispatch.target_id == target_id,
+        ReminderDispatch.due_at == due_at
+    )
+
+
+def _due_invoices(now, after_id, limit):
+    return Invoice.query.options(
+        joinedload(Invoice.user),
+        joinedload(Invoice.property)
+    ).filter(
+        Invoice.id > after_id,
+        Invoice.status.in_(UNPAID_INVOICE_STATUSES),
+        Invoice.due_date > now,
+        Invoice.due_date <= now + timedelta(days=INVOICE_REMINDER_DAYS),
+        _not_dispatched('invoice_due', Invoice.id, Invoice.due_date)
+    ).order_by(Invoice.id).limit(limit).all()
+
+
+def _expiring_leases(now, horizon, after_id, limit):
+    return Lease.query.options(
+        joinedload(Lease.booking).joinedload(Booking.user),
+        joinedload(Lease.property)
+    ).filter(
+        Lease.id > after_id,
+        Lease.status == 'active',
+        Lease.end_date > now,
+        Lease.end_date <= horizon,
+        _not_dispatched('lease_expiry', Lease.id, Lease.end_date)
+    ).order_by(Lease.id).limit(limit).all()
+
+
+def _queue_invoice_reminder(invoice, now):
+    if invoice.invoice_type == 'rent' and invoice.property is not None:
+        days_until_due = max((invoice.due_date.date() - now.date()).days, 0)
+        return send_rent_reminder_email(invoice.user, invoice.property, days_until_due, commit=False)
+    return send_payment_reminder_email(invoice.user, invoice, commit=False)
+
+
+def _record(reminder_type, target_id, due_at, user_id, now):
+    db.session.add(ReminderDispatch(
+        reminder_type=reminder_type,
+        target_id=target_id,
+        due_at=due_at,
+        user_id=user_id,
+        sent_at=now
+    ))
+
+
+def _commit_batch(label):
+    try:
+        db.session.commit()
+        return True
+    except Exception as e:
+        # Most likely another dispatcher recorded the same reminders first
+        db.session.rollback()
+        print(f"Error recording {label} reminders: {str(e)}")
+        return False
+
+
+def dispatch_reminders(now=None, batch_size=REMINDER_BATCH_SIZE):
+    """Queue payment reminders and lease expiry alerts that are due.
+
+    Invoices are reminded INVOICE_REMINDER_DAYS before due_date, active
+    leases renewal_notice_days before end_date. Each batch is one indexed
+    query with tenants and properties eager-loaded; its outbox rows and
+    ledger entries are committed together, so a reminder is queued at most
+    once per due date. Returns counts per reminder type.
+    """
+    now = now or datetime.utcnow()
+    counts = {'invoice_due': 0, 'lease_expiry': 0}
+
+    after_id = 0
+    while True:
+        invoices = _due_invoices(now, after_id, batch_size)
+        if not invoices:
+            break
+        after_id = invoices[-1].id
+        queued = 0
+        for invoice in invoices:
+            if _queue_invoice_reminder(invoice, now):
+                _record('invoice_due', invoice.id, invoice.due_date, invoice.user_id, now)
+                queued += 1
+        if _commit_batch('invoice'):
+            counts['invoice_due'] += queued
+
+    max_notice = db.session.query(db.func.max(Lease.renewal_notice_days)).filter(
+        Lease.status == 'active').scalar()
+    horizon = now + timedelta(days=max(max_notice or 0, DEFAULT_LEASE_NOTICE_DAYS))
+    after_id = 0
+    while True:
+        leases = _expiring_leases(now, horizon, after_id, batch_size)
+        if not leases:
+            break
+        after_id = leases[-1].id
+        queued = 0
+        for lease in leases:
+            notice_days = lease.renewal_notice_days or DEFAULT_LEASE_NOTICE_DAYS
+            if lease.end_date > now + timedelta(days=notice_days):
+                continue
+            tenant = lease.booking.user
+            if send_lease_expiration_alert(tenant, lease, commit=False):
+                _record('lease_expiry', lease.id, lease.end_date, tenant.id, now)
+                queued += 1
+        if _commit_batch('lease'):
+            counts['lease_expiry'] += queued
+    return counts
@@ -0,0 +1,47 @@
+from apscheduler.schedulers.background import BackgroundScheduler
+from app.models import db
+
+scheduler = BackgroundScheduler(timezone='UTC')
+
+
+def _scheduled_jobs(app):
+    """(job id, callable, interval in minutes) for every periodic job"""
+    from app.utils.digest import send_message_digests
+    from app.utils.archival import archive_messages
+    from app.utils.reminders import dispatch_reminders
+    from app.utils.recurring_invoices import materialize_recurring_invoices
+    from app.utils.payment_schedules import process_payment_schedules
+    return [
+        ('message_digests', send_message_digests, app.config.get('DIGEST_CHECK_MINUTES', 15)),
+        ('message_archival', lambda: archive_messages(app.config.get('MESSAGE_ARCHIVE_AFTER_DAYS', 180)),
+         app.config.get('ARCHIVE_CHECK_MINUTES', 24 * 60)),
+        ('reminders', dispatch_reminders, app.config.get('REMINDER_CHECK_MINUTES', 60)),
+        ('recurring_invoices', materialize_recurring_invoices, app.config.get('RECURRING_INVOICE_CHECK_MINUTES', 60)),
+        ('payment_schedules', process_payment_schedules, app.config.get('PAYMENT_SCHEDULE_CHECK_MINUTES', 60)),
+    ]
+
+
+def _run_job(app, job_id, job):
+    with app.app_context():
+        try:
+            job()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error running scheduled job {job_id}: {str(e)}")
+        finally:
+            db.session.remove()
+
+
+def init_scheduler(app):
+    """Start the periodic jobs if SCHEDULER_ENABLED is set.
+
+    Enable it on exactly one process (e.g. a dedicated worker, not every
+    gunicorn worker), otherwise each process would run every job.
+    """
+    if not app.config.get('SCHEDULER_ENABLED') or scheduler.running:
+        return
+
+    for job_id, job, minutes in _scheduled_jobs(app):
+        scheduler.add_job(_run_job, 'interval', minutes=minutes, args=[app, job_id, job],
+                          id=job_id, max_instances=1, coalesce=True, replace_existing=True)
+    scheduler.start()
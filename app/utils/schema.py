@@ -0,0 +1,72 @@
+from sqlalchemy import inspect, literal, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from app.models import db
+
+
+def _rebuild_conversations():
+    from app.utils.conversations import rebuild_conversations
+    rebuild_conversations()
+
+
+# Columns added to tables that already existed. db.create_all() creates
+# missing tables but never alters existing ones, so these are ALTERed in.
+# Each entry is (table, column, backfill run once right after the ALTER).
+ADDED_COLUMNS = [
+    ('messages', 'conversation_id', _rebuild_conversations),
+    ('invoices', 'recurring_parent_id', None),
+    ('payment_schedules', 'status', None),
+    ('payment_schedules', 'first_payment_date', None),
+    ('payment_schedules', 'installment_count', None),
+]
+
+
+def _column_ddl(column, dialect):
+    ddl = f'{column.name} {column.type.compile(dialect=dialect)}'
+    if column.default is not None and column.default.is_scalar:
+        default = literal(column.default.arg).compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+        ddl += f' DEFAULT {default}'
+    if not column.nullable:
+        ddl += ' NOT NULL'
+    for foreign_key in column.foreign_keys:
+        ddl += f' REFERENCES {foreign_key.column.table.name} ({foreign_key.column.name})'
+    return ddl
+
+
+def upgrade_schema():
+    """Add missing columns and indexes to existing tables (idempotent; run at startup)"""
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    backfills = []
+
+    for table_name, column_name, backfill in ADDED_COLUMNS:
+        if table_name not in tables:
+            continue
+        if column_name in {c['name'] for c in inspector.get_columns(table_name)}:
+            continue
+        column = db.metadata.tables[table_name].c[column_name]
+        try:
+            db.session.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {_column_ddl(column, db.engine.dialect)}'))
+            db.session.commit()
+        except (OperationalError, ProgrammingError) as e:
+            # Another process starting up at the same time got there first
+            db.session.rollback()
+            print(f"Error adding column {table_name}.{column_name}: {str(e)}")
+            continue
+        print(f"Added column {table_name}.{column_name}")
+        if backfill is not None:
+            backfills.append(backfill)
+
+    # create_all() skips indexes on tables that already exist as well
+    connection = db.session.connection()
+    for table in db.metadata.tables.values():
+        if table.name not in tables:
+            continue
+        columns = {c['name'] for c in inspect(connection).get_columns(table.name)}
+        for index in table.indexes:
+            if all(column.name in columns for column in index.columns):
+                index.create(connection, checkfirst=True)
+    db.session.commit()
+
+    for backfill in backfills:
+        backfill()
+        db.session.commit()
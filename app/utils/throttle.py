@@ -0,0 +1,151 @@
+import time
+from threading import Lock
+
+# Typing indicators: a burst of 3 state changes, then one every 2 seconds
+TYPING_BURST = 3
+TYPING_RATE = 0.5  # tokens per second
+# Receivers drop a typing indicator they haven't had refreshed in this long,
+# so a throttled or lost stop_typing can't leave it stuck on
+TYPING_TTL_SECONDS = 6
+# Keep re-announcing an ongoing "typing" state this often
+TYPING_REFRESH_SECONDS = 4
+# Forget (user, conversation) entries idle for this long
+TYPING_IDLE_SECONDS = 300
+# Email: a burst of 5 per recipient, then one every 2 minutes
+EMAIL_BURST = 5
+EMAIL_RATE = 1 / 120.0
+EMAIL_IDLE_SECONDS = 3600
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` burst, refilled at `rate` per second"""
+
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated')
+
+    def __init__(self, capacity, rate, now=None):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = time.monotonic() if now is None else now
+
+    def take(self, now=None, tokens=1):
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+
+class TypingThrottle:
+    """Turns raw typing/stop_typing keystroke events into a throttled
+    stream of state changes per (user, conversation).
+
+    Repeats of the current state are dropped (apart from a periodic refresh
+    while typing continues) and actual changes spend a token, so a client
+    can't push more than the bucket allows to the conversation room.
+    """
+
+    def __init__(self, burst=TYPING_BURST, rate=TYPING_RATE,
+                 refresh_seconds=TYPING_REFRESH_SECONDS, idle_seconds=TYPING_IDLE_SECONDS):
+        self.burst = burst
+        self.rate = rate
+        self.refresh_seconds = refresh_seconds
+        self.idle_seconds = idle_seconds
+        self._states = {}  # (user_id, room) -> [bucket, typing, last_emitted]
+        self._lock = Lock()
+        self._last_prune = time.monotonic()
+        self.counters = {'received': 0, 'emitted': 0, 'dropped_duplicate': 0, 'dropped_throttled': 0}
+
+    def update(self, user_id, room, typing, now=None):
+        """Record a client event; returns True if the new state should be emitted"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.counters['received'] += 1
+            self._prune(now)
+
+            state = self._states.get((user_id, room))
+            if state is None:
+                state = [TokenBucket(self.burst, self.rate, now), False, 0.0]
+                self._states[(user_id, room)] = state
+            bucket, current, last_emitted = state
+
+            if typing == current and not (typing and now - last_emitted >= self.refresh_seconds):
+                self.counters['dropped_duplicate'] += 1
+                return False
+            if not bucket.take(now):
+                self.counters['dropped_throttled'] += 1
+                return False
+
+            state[1] = typing
+            state[2] = now
+            self.counters['emitted'] += 1
+            return True
+
+    def forget(self, user_id):
+        """Drop a user's state, e.g. after their last connection closes"""
+        with self._lock:
+            for key in [key for key in self._states if key[0] == user_id]:
+                del self._states[key]
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.counters, tracked=len(self._states))
+
+    def _prune(self, now):
+        if now - self._last_prune < self.idle_seconds:
+            return
+        self._last_prune = now
+        for key, state in list(self._states.items()):
+            if now - state[0].updated > self.idle_seconds:
+                del self._states[key]
+
+
+class EmailRateLimiter:
+    """Per-recipient token buckets in front of the email outbox.
+
+    `allow` says whether an email may go out right away; the caller holds
+    back the ones that may not and coalesces them. Counters record what
+    happened to every email offered.
+    """
+
+    def __init__(self, burst=EMAIL_BURST, rate=EMAIL_RATE, idle_seconds=EMAIL_IDLE_SECONDS):
+        self.burst = burst
+        self.rate = rate
+        self.idle_seconds = idle_seconds
+        self._buckets = {}
+        self._lock = Lock()
+        self._last_prune = time.monotonic()
+        self.counters = {'received': 0, 'sent': 0, 'held': 0, 'coalesced': 0}
+
+    def allow(self, recipient, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._prune(now)
+            bucket = self._buckets.get(recipient)
+            if bucket is None:
+                bucket = self._buckets[recipient] = TokenBucket(self.burst, self.rate, now)
+            return bucket.take(now)
+
+    def record(self, outcome):
+        """Count an offered email's outcome: 'sent', 'held' or 'coalesced'"""
+        with self._lock:
+            self.counters['received'] += 1
+            self.counters[outcome] += 1
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.counters, tracked=len(self._buckets))
+
+    def _prune(self, now):
+        if now - self._last_prune < self.idle_seconds:
+            return
+        self._last_prune = now
+        for key, bucket in list(self._buckets.items()):
+            if now - bucket.updated > self.idle_seconds:
+                del self._buckets[key]
+
+
+typing_throttle = TypingThrottle()
+email_limiter = EmailRateLimiter()
@@ -0,0 +1,195 @@
+from datetime import date, datetime, timedelta
+from app.models import db, Booking, Payment, Property, PropertyAnalytics
+
+GRANULARITIES = ('day', 'week', 'month')
+METRICS = ('revenue', 'bookings', 'occupancy', 'views')
+
+# Metrics that are averaged (rather than summed) when rolled up into buckets
+AVERAGED_METRICS = {'occupancy'}
+
+
+def _to_date(value):
+    """func.date() returns a string on SQLite and a date elsewhere"""
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _scoped_property_ids(landlord_id, property_id=None):
+    query = db.session.query(Property.id).filter(Property.landlord_id == landlord_id)
+    if property_id:
+        query = query.filter(Property.id == property_id)
+    return query
+
+
+# ==================== DAILY AGGREGATES ====================
+
+def daily_revenue(landlord_id, start, end, property_id=None):
+    """Completed payment totals per day"""
+    day = db.func.date(Payment.completed_at)
+    rows = db.session.query(day, db.func.sum(Payment.amount)).join(
+        Booking, Booking.id == Payment.booking_id
+    ).filter(
+        Booking.property_id.in_(_scoped_property_ids(landlord_id, property_id)),
+        Payment.status == 'completed',
+        Payment.completed_at >= start,
+        Payment.completed_at < end + timedelta(days=1)
+    ).group_by(day).all()
+    return {_to_date(d): float(v or 0) for d, v in rows}
+
+
+def daily_bookings(landlord_id, start, end, property_id=None):
+    """Booking requests created per day"""
+    day = db.func.date(Booking.created_at)
+    rows = db.session.query(day, db.func.count(Booking.id)).filter(
+        Booking.property_id.in_(_scoped_property_ids(landlord_id, property_id)),
+        Booking.created_at >= start,
+        Booking.created_at < end + timedelta(days=1)
+    ).group_by(day).all()
+    return {_to_date(d): float(v) for d, v in rows}
+
+
+def daily_views(landlord_id, start, end, property_id=None):
+    """Property views per day from the analytics table"""
+    rows = db.session.query(
+        PropertyAnalytics.analytics_date, db.func.sum(PropertyAnalytics.total_views)
+    ).filter(
+        PropertyAnalytics.property_id.in_(_scoped_property_ids(landlord_id, property_id)),
+        PropertyAnalytics.analytics_date >= start,
+        PropertyAnalytics.analytics_date <= end
+    ).group_by(PropertyAnalytics.analytics_date).all()
+    return {_to_date(d): float(v or 0) for d, v in rows}
+
+
+def daily_occupancy(landlord_id, start, end, property_id=None):
+    """Percentage of rooms occupied per day.
+
+    Uses a difference array over booking boundaries, so the cost is
+    proportional to bookings + days rather than bookings * days.
+    """
+    property_ids = _scoped_property_ids(landlord_id, property_id)
+    total_rooms = db.session.query(db.func.sum(Property.total_rooms)).filter(
+        Property.id.in_(property_ids)
+    ).scalar() or 0
+    if not total_rooms:
+        return {}
+
+    bookings = db.session.query(
+        Booking.check_in_date, Booking.check_out_date, Booking.num_rooms
+    ).filter(
+        Booking.property_id.in_(property_ids),
+        Booking.status.in_(['approved', 'completed']),
+        Booking.check_in_date <= end,
+        db.or_(Booking.check_out_date.is_(None), Booking.check_out_date > start)
+    ).all()
+
+    num_days = (end - start).days + 1
+    deltas = [0] * (num_days + 1)
+    for check_in, check_out, num_rooms in bookings:
+        first = max((_to_date(check_in) - start).days, 0)
+        last = num_days if check_out is None else min((_to_date(check_out) - start).days, num_days)
+        if last > first:
+            deltas[first] += num_rooms or 1
+            deltas[last] -= num_rooms or 1
+
+    occupancy = {}
+    occupied = 0
+    for offset in range(num_days):
+        occupied += deltas[offset]
+        occupancy[start + timedelta(days=offset)] = min(occupied / total_rooms * 100, 100.0)
+    return occupancy
+
+
+DAILY_AGGREGATES = {
+    'revenue': daily_revenue,
+    'bookings': daily_bookings,
+    'occupancy': daily_occupancy,
+    'views': daily_views,
+}
+
+
+# ==================== BUCKETING & DOWNSAMPLING ====================
+
+def bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_series(daily, start, end, granularity, average=False):
+    """Roll a sparse {date: value} dict into a dense, ordered bucket series"""
+    totals = {}
+    counts = {}
+    day = start
+    while day <= end:
+        key = bucket_start(day, granularity)
+        totals[key] = totals.get(key, 0.0) + daily.get(day, 0.0)
+        counts[key] = counts.get(key, 0) + 1
+        day += timedelta(days=1)
+
+    if average:
+        return [(key, totals[key] / counts[key]) for key in sorted(totals)]
+    return [(key, totals[key]) for key in sorted(totals)]
+
+
+def lttb(points, threshold):
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, for every bucket in between,
+    the point forming the largest triangle with its neighbours, which
+    preserves peaks and troughs far better than plain striding.
+    """
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    xs = [p[0].toordinal() for p in points]
+    ys = [p[1] for p in points]
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        max_area = -1
+        chosen = range_start
+        for j in range(range_start, range_end):
+            area = abs(
+                (xs[a] - avg_x) * (ys[j] - ys[a]) -
+                (xs[a] - xs[j]) * (avg_y - ys[a])
+            )
+            if area > max_area:
+                max_area = area
+                chosen = j
+
+        sampled.append(points[chosen])
+        a = chosen
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def build_timeseries(metric, landlord_id, start, end, granularity='day', max_points=500, property_id=None):
+    """Aggregate, bucket and downsample a metric for charting"""
+    daily = DAILY_AGGREGATES[metric](landlord_id, start, end, property_id)
+    series = bucket_series(daily, start, end, granularity, average=metric in AVERAGED_METRICS)
+    downsampled = lttb(series, max_points)
+
+    return {
+        'metric': metric,
+        'granularity': granularity,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'total_points': len(series),
+        'points': [{'t': key.isoformat(), 'v': round(value, 2)} for key, value in downsampled],
+    }
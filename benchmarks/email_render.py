@@ -0,0 +1,78 @@
+"""
+Benchmark per-email render cost: compiling the HTML with
+render_template_string for every email (the old send_email path) against
+rendering the precompiled templates from the email template registry.
+
+Usage: python benchmarks/email_render.py [emails]
+"""
+import os
+import sys
+import time
+from datetime import date
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template_string
+from app import create_app
+from app.utils.email_templates import email_templates
+from config import Config
+
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SOCKETIO_MESSAGE_QUEUE = None
+    EMAIL_WORKERS = 0
+    SCHEDULER_ENABLED = False
+
+
+def _context(i):
+    landlord = SimpleNamespace(full_name='Thandi Landlord')
+    prop = SimpleNamespace(title=f'Garden Flat {i}', address=f'{i} Main Road', city='Johannesburg',
+                           landlord=landlord)
+    user = SimpleNamespace(full_name=f'Tenant {i}', email=f'tenant{i}@example.com')
+    booking = SimpleNamespace(property=prop, user=user, check_in_date=date(2026, 1, 1),
+                              num_rooms=1, total_price=5000.0 + i)
+    return {'user': user, 'booking': booking, 'response': 'See you on the 1st'}
+
+
+def _legacy_html(context):
+    # What each helper used to build before handing it to render_template_string
+    booking = context['booking']
+    return f"""
+    <h2 style="color: #28a745;">✓ Booking Approved!</h2>
+    <p>Hi {context['user'].full_name},</p>
+    <ul>
+        <li><strong>Property:</strong> {booking.property.title}</li>
+        <li><strong>Address:</strong> {booking.property.address}, {booking.property.city}</li>
+        <li><strong>Check-in:</strong> {booking.check_in_date}</li>
+        <li><strong>Total Price:</strong> R{booking.total_price:.2f}</li>
+    </ul>
+    <h3>Message from Landlord:</h3><p>{context['response']}</p>
+    """
+
+
+def _time(label, render, contexts):
+    start = time.perf_counter()
+    for context in contexts:
+        render(context)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:8.1f} ms total   {elapsed / len(contexts) * 1e6:8.1f} us/email")
+    return elapsed
+
+
+def run(emails=2000):
+    app = create_app(BenchmarkConfig)
+    contexts = [_context(i) for i in range(emails)]
+
+    with app.app_context():
+        print(f"Rendering {emails} booking approval emails\n")
+        legacy = _time('render_template_string',
+                       lambda context: render_template_string(_legacy_html(context)), contexts)
+        registry = _time('registry (html + text)',
+                         lambda context: email_templates.render('booking_approved', **context), contexts)
+        print(f"\nSpeed-up: {legacy / registry:.1f}x")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
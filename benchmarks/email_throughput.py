@@ -0,0 +1,125 @@
+"""
+Benchmark the email path end to end: approve N bookings through
+landlord.approve_booking and deliver the approval emails to an in-process
+SMTP sink.
+
+Reports enqueue latency (time spent in the approve request), delivery
+throughput (emails/second until the sink has them all) and the thread
+and SMTP connection counts it took.
+
+Usage: python benchmarks/email_throughput.py [bookings] [workers]
+Set BENCHMARK_DATABASE_URL to run against something other than a
+temporary SQLite file.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models import User, Property, Booking
+from benchmarks.smtp_sink import SMTPSink
+from config import Config
+
+
+def _config(database_url, sink, workers):
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SOCKETIO_MESSAGE_QUEUE = None
+        SCHEDULER_ENABLED = False
+        WTF_CSRF_ENABLED = False
+        MAIL_SERVER = sink.host
+        MAIL_PORT = sink.port
+        MAIL_USE_TLS = False
+        MAIL_USE_SSL = False
+        MAIL_USERNAME = None
+        MAIL_PASSWORD = None
+        EMAIL_WORKERS = workers
+        EMAIL_POLL_SECONDS = 1
+    return BenchmarkConfig
+
+
+def _seed(count):
+    landlord = User(username='bench_landlord', email='landlord@bench.local', full_name='Bench Landlord', role='landlord')
+    landlord.set_password('password')
+    db.session.add(landlord)
+    db.session.flush()
+
+    property = Property(landlord_id=landlord.id, title='Bench House', description='Benchmark property',
+                        property_type='house', address='1 Bench Road', city='Johannesburg', province='Gauteng',
+                        bedrooms=count, bathrooms=1, total_rooms=count, available_rooms=count, price_per_month=5000)
+    db.session.add(property)
+    db.session.flush()
+
+    booking_ids = []
+    for i in range(count):
+        tenant = User(username=f'bench_tenant_{i}', email=f'tenant{i}@bench.local', full_name=f'Tenant {i}', role='general')
+        tenant.password_hash = landlord.password_hash
+        db.session.add(tenant)
+        db.session.flush()
+        booking = Booking(user_id=tenant.id, property_id=property.id, check_in_date=date(2026, 1, 1),
+                          num_rooms=1, total_price=5000, status='pending')
+        db.session.add(booking)
+        db.session.flush()
+        booking_ids.append(booking.id)
+    db.session.commit()
+    return landlord.id, booking_ids
+
+
+def run(bookings=200, workers=2):
+    sink = SMTPSink().start()
+    database_file = None
+    database_url = os.environ.get('BENCHMARK_DATABASE_URL')
+    if not database_url:
+        handle, database_file = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        database_url = f'sqlite:///{database_file}'
+
+    threads_before = threading.active_count()
+    app = create_app(_config(database_url, sink, workers))
+    try:
+        with app.app_context():
+            landlord_id, booking_ids = _seed(bookings)
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(landlord_id)
+            session['_fresh'] = True
+
+        latencies = []
+        start = time.perf_counter()
+        for booking_id in booking_ids:
+            request_start = time.perf_counter()
+            response = client.post(f'/landlord/booking/{booking_id}/approve', data={'response': 'Welcome!'})
+            latencies.append(time.perf_counter() - request_start)
+            if response.status_code != 302:
+                print(f"Unexpected status {response.status_code} approving booking {booking_id}")
+        enqueued = time.perf_counter()
+
+        delivered = sink.wait_for(bookings, timeout=max(60, bookings))
+        finished = sink.messages[-1]['received_at'] if sink.messages else time.perf_counter()
+
+        latencies.sort()
+        print(f"Approved {bookings} bookings with {workers} email worker(s)\n")
+        print(f"Enqueue latency     mean {statistics.mean(latencies) * 1000:7.2f} ms"
+              f"   p50 {latencies[len(latencies) // 2] * 1000:7.2f} ms"
+              f"   p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.2f} ms")
+        print(f"Enqueue phase       {enqueued - start:7.2f} s")
+        print(f"Delivered           {len(sink.messages)}/{bookings}{'' if delivered else '  (timed out)'}")
+        print(f"Delivery throughput {len(sink.messages) / max(finished - start, 1e-9):7.1f} emails/s")
+        print(f"SMTP connections    {sink.connections}")
+        print(f"Threads             {threading.active_count()} (started with {threads_before})")
+    finally:
+        sink.stop()
+        if database_file:
+            os.remove(database_file)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 2)
@@ -0,0 +1,95 @@
+"""
+Benchmark invoice PDF throughput: rendering one invoice at a time with
+styles rebuilt per call (the request path) against the batch renderer,
+which prebuilds styles once per worker process and spreads invoices over
+a process pool.
+
+Usage: python benchmarks/invoice_pdfs.py [invoices] [workers]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models import User, Invoice
+from app.utils.invoice_generator import invoice_snapshot, invoice_pdf_filename, render_invoice_pdf
+from app.utils.invoice_pdfs import render_invoice_pdfs
+from config import Config
+
+
+def _config(database_url, upload_folder):
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SOCKETIO_MESSAGE_QUEUE = None
+        SCHEDULER_ENABLED = False
+        EMAIL_WORKERS = 0
+        INVOICE_PDF_WORKERS = 0
+        UPLOAD_FOLDER = upload_folder
+    return BenchmarkConfig
+
+
+def _seed(count):
+    tenant = User(username='bench_tenant', email='tenant@bench.local', full_name='Bench Tenant', role='general')
+    tenant.set_password('password')
+    db.session.add(tenant)
+    db.session.flush()
+
+    due_date = datetime.utcnow() + timedelta(days=30)
+    for i in range(count):
+        db.session.add(Invoice(
+            user_id=tenant.id,
+            invoice_number=f'BENCH-{i:06d}',
+            description=f'Monthly rent - unit {i}',
+            amount=5000 + i,
+            currency='ZAR',
+            invoice_type='rent',
+            due_date=due_date,
+            status='sent'
+        ))
+    db.session.commit()
+
+
+def run(count=500, workers=None):
+    workers = workers or os.cpu_count() or 1
+    work_dir = tempfile.mkdtemp(prefix='invoice-bench-')
+    app = create_app(_config(f"sqlite:///{os.path.join(work_dir, 'bench.db')}", os.path.join(work_dir, 'uploads')))
+
+    try:
+        with app.app_context():
+            _seed(count)
+            print(f"Rendering {count} invoices\n")
+
+            # One at a time, styles rebuilt per invoice
+            sequential_dir = os.path.join(work_dir, 'sequential')
+            os.makedirs(sequential_dir)
+            start = time.perf_counter()
+            for invoice in Invoice.query.order_by(Invoice.id):
+                snapshot = invoice_snapshot(invoice)
+                render_invoice_pdf(snapshot, os.path.join(sequential_dir, invoice_pdf_filename(snapshot)))
+            sequential = time.perf_counter() - start
+            print(f"Sequential            {sequential:7.2f} s   {count / sequential:8.1f} invoices/s")
+
+            # Batch: process pool, styles prebuilt per worker, bulk pdf_file updates
+            start = time.perf_counter()
+            stats = render_invoice_pdfs(workers=workers)
+            batch = time.perf_counter() - start
+            print(f"Batch ({workers} workers)   {batch:7.2f} s   {count / batch:8.1f} invoices/s   {stats}")
+
+            # Re-run: every file already exists under its content hash
+            start = time.perf_counter()
+            stats = render_invoice_pdfs(workers=workers)
+            print(f"Batch re-run          {time.perf_counter() - start:7.2f} s   {stats}")
+
+            print(f"\nSpeed-up: {sequential / batch:.1f}x")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+        int(sys.argv[2]) if len(sys.argv) > 2 else None)
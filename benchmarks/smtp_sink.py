@@ -0,0 +1,127 @@
+"""
+In-process SMTP sink for benchmarks and local testing.
+
+Speaks just enough SMTP (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT)
+for smtplib / Flask-Mail, records every message it receives and counts
+connections. No TLS or auth: point MAIL_SERVER/MAIL_PORT at it with
+MAIL_USE_TLS = False.
+
+    sink = SMTPSink().start()
+    ...
+    sink.wait_for(100)
+    sink.stop()
+"""
+import socketserver
+import threading
+import time
+from email import message_from_bytes
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def _reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        sink = self.server.sink
+        sink._connected()
+        self._reply('220 smtp-sink ready')
+        sender, recipients = None, []
+
+        for raw in self.rfile:
+            command = raw.decode('utf-8', 'replace').rstrip('\r\n')
+            verb = command[:4].upper()
+
+            if verb in ('EHLO', 'HELO'):
+                if verb == 'EHLO':
+                    self._reply('250-smtp-sink')
+                    self._reply('250-8BITMIME')
+                    self._reply('250 SIZE 52428800')
+                else:
+                    self._reply('250 smtp-sink')
+            elif verb == 'MAIL':
+                sender, recipients = command.split(':', 1)[1].strip(), []
+                self._reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip())
+                self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                for data in self.rfile:
+                    if data in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                sink._received(sender, recipients, b''.join(lines))
+                sender, recipients = None, []
+                self._reply('250 OK: queued')
+            elif verb in ('RSET', 'NOOP'):
+                if verb == 'RSET':
+                    sender, recipients = None, []
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                break
+            else:
+                self._reply('502 Command not implemented')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """Threaded SMTP server that keeps what it receives in memory"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._server = _Server((host, port), _SMTPHandler)
+        self._server.sink = self
+        self._lock = threading.Condition()
+        self._thread = None
+        self.messages = []
+        self.connections = 0
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name='smtp-sink')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _connected(self):
+        with self._lock:
+            self.connections += 1
+
+    def _received(self, sender, recipients, data):
+        message = message_from_bytes(data)
+        with self._lock:
+            self.messages.append({
+                'sender': sender,
+                'recipients': recipients,
+                'subject': message.get('Subject'),
+                'message': message,
+                'received_at': time.perf_counter()
+            })
+            self._lock.notify_all()
+
+    def wait_for(self, count, timeout=60):
+        """Block until `count` messages have arrived; returns True if they did"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while len(self.messages) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+            return True
@@ -11,6 +11,8 @@ class Config:
     # Use SQLite everywhere (local and production)
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///rental_booking.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Cold storage for archived messages; defaults to the main database
+    ARCHIVE_DATABASE_URL = os.environ.get('ARCHIVE_DATABASE_URL')
     UPLOAD_FOLDER = 'app/static/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     
@@ -27,6 +29,12 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'noreply@amahlrentals.com'
+    # Outbox worker threads per process (0 = only drained explicitly)
+    EMAIL_WORKERS = int(os.environ.get('EMAIL_WORKERS') or 2)
+    EMAIL_POLL_SECONDS = 5
+    EMAIL_MAX_ATTEMPTS = 6
+    # Background invoice PDF render threads (0 = only rendered on drain)
+    INVOICE_PDF_WORKERS = 1
     
     # Google Maps
     GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY') or 'your_google_maps_key'
@@ -34,9 +42,29 @@ class Config:
     # Celery Configuration
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or 'redis://localhost:6379/0'
+    # In-process periodic jobs (digests etc.); enable on a single process only
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '').lower() in ('1', 'true', 'yes')
+    DIGEST_CHECK_MINUTES = 15
+    MESSAGE_ARCHIVE_AFTER_DAYS = 180
+    ARCHIVE_CHECK_MINUTES = 24 * 60
+    REMINDER_CHECK_MINUTES = 60
+    RECURRING_INVOICE_CHECK_MINUTES = 60
+    PAYMENT_SCHEDULE_CHECK_MINUTES = 60
     
     # SocketIO Configuration
-    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or 'redis://localhost:6379/1'
+    # 'local://' fans out in-process only (tests, single node); use a broker
+    # URL such as redis://localhost:6379/1 when running several workers
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or 'local://'
+    # Shared presence store for multi-worker deployments; per-process if unset
+    PRESENCE_REDIS_URL = os.environ.get('PRESENCE_REDIS_URL')
+    PRESENCE_HEARTBEAT_SECONDS = 25
+    PRESENCE_TTL_SECONDS = 60
+    NOTIFICATION_STREAM_KEEPALIVE = 15  # seconds between SSE keepalive comments
+    # The SSE stream holds a worker per open tab, so only enable it behind an
+    # async worker class (gunicorn -k gevent/eventlet); otherwise the bell
+    # polls the unread count
+    NOTIFICATION_STREAM_ENABLED = os.environ.get('NOTIFICATION_STREAM_ENABLED', '').lower() in ('1', 'true', 'yes')
+    NOTIFICATION_POLL_SECONDS = 60
     
     # DocuSign Configuration
     DOCUSIGN_INTEGRATION_KEY = os.environ.get('DOCUSIGN_INTEGRATION_KEY')
@@ -48,4 +76,6 @@ class Config:
     
     # Application Settings
     ITEMS_PER_PAGE = 10
+    TIMESERIES_MAX_POINTS = 500  # Upper bound on points returned to charts
+    FORECAST_MAX_MONTHS = 60
     ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL') or 'admin@amahlrentals.com'
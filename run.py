@@ -1,6 +1,9 @@
 from app import create_app
+from app.utils.realtime import socketio
 
-app = create_app()
-
+# Build the app only when run directly: the invoice render pool spawns
+# processes that re-import the main module (`flask --app run` still finds
+# create_app)
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app = create_app()
+    socketio.run(app, debug=True, host='0.0.0.0', port=5000)